@@ -17,4 +17,90 @@ UHC_CLIENT_ID = "your_client_id_here"
 UHC_CLIENT_SECRET = "your_client_secret_here"
 
 # Local token storage file
-TOKEN_FILE = "uhc_oauth_token.json" 
\ No newline at end of file
+TOKEN_FILE = "uhc_oauth_token.json" 
+
+# Optional: request hedging for the eligibility, networkStatus and copay lookups.
+# When enabled, a slow request gets a second identical request after it has been
+# outstanding longer than UHC_HEDGE_PERCENTILE of recent latency; the first answer wins.
+UHC_HEDGE_ENABLED = False
+UHC_HEDGE_PERCENTILE = 95.0   # percentile of recent latency that triggers a hedge
+UHC_HEDGE_MAX_RATE = 0.1      # cap hedges at this fraction of requests
+UHC_HEDGE_MIN_SAMPLES = 20    # latency samples needed before hedging starts
+UHC_HEDGE_MIN_DELAY = 0.05    # minimum wait before hedging, in seconds
+
+# Optional: memory budgets for eligibility results kept in each session
+UHC_RESULT_SESSION_BUDGET_KB = 2048   # per browser session
+UHC_RESULT_GLOBAL_BUDGET_MB = 64      # across all sessions on this server
+
+# Optional: swagger spec that sampled responses are checked against for schema drift
+# (defaults to the "eligibility prod swagger (1).json" file next to streamlit_app.py)
+# UHC_SWAGGER_FILE = "eligibility prod swagger (1).json"
+UHC_SCHEMA_DRIFT_SAMPLE = 20          # check one response in this many
+# Install orjson (pip install orjson) for faster response parsing; the standard json module is the fallback
+
+# Optional: where roster re-verification keeps per-member eligibility digests
+UHC_ROSTER_DIGEST_FILE = "uhc_roster_digests.json"
+# Secret for the member keys in that file (defaults to UHC_CLIENT_SECRET; changing it resets the digests)
+# UHC_ROSTER_DIGEST_SECRET = "a-long-random-string"
+
+# Optional: pre-verify upcoming appointments in the background so desk lookups hit the cache.
+# Appointment CSVs need memberId, dateOfBirth and appointmentTime columns.
+# UHC_APPOINTMENTS_FILE = "appointments.csv"
+# UHC_APPOINTMENTS_DIR = "appointments/"
+UHC_PREVERIFY_HORIZON_HOURS = 18     # pre-verify appointments within this many hours
+UHC_PREVERIFY_OFFPEAK_HOURS = ""     # only run in this hour window, e.g. "19-7"; empty means any time
+UHC_PREVERIFY_RATE = 1.0             # upstream lookups per second
+UHC_PREVERIFY_INTERVAL = 900         # seconds between schedule scans
+UHC_LOOKUP_CACHE_TTL = 43200         # seconds an eligibility result is served from cache
+UHC_LOOKUP_CACHE_MAX_ENTRIES = 5000
+
+# Optional: pool of client credentials to spread API requests across.
+# Each credential gets its own token file, quota counters and health state;
+# throttled (429) credentials are drained automatically. Include the primary
+# UHC_CLIENT_ID/UHC_CLIENT_SECRET pair here if it should take traffic too.
+# UHC_CREDENTIALS = [
+#     {"name": "desk", "client_id": "...", "client_secret": "...", "quota_per_minute": 60},
+#     {"name": "batch", "client_id": "...", "client_secret": "..."},
+# ]
+UHC_CREDENTIAL_QUOTA_PER_MINUTE = 0   # default per-credential quota; 0 means no local limit
+
+# Optional: profile every script rerun and API request for all sessions
+# (each session can also switch profiling on from the sidebar)
+UHC_PROFILING = False
+UHC_PROFILE_BUFFER_SIZE = 20   # number of recent profiles kept for download
+
+# Optional: record scrubbed API responses to a cassette, or replay them without touching the network
+UHC_CASSETTE_MODE = ""                  # "record", "replay" or "" (off)
+UHC_CASSETTE_FILE = "uhc_cassette.jsonl"
+UHC_CASSETTE_REPLAY_LATENCY = False     # sleep for each response's recorded latency on replay
+UHC_CASSETTE_LATENCY_SCALE = 1.0
+
+# Optional: background eligibility searches
+UHC_SEARCH_WORKERS = 8            # worker threads shared by all sessions
+UHC_SEARCH_MAX_ACTIVE = 5         # queued or running searches allowed per session
+UHC_SEARCH_HISTORY = 20           # finished searches listed per session
+UHC_SEARCH_POLL_INTERVAL = 1.0    # seconds between status refreshes while searches are active
+
+# Optional: state shared by all app replicas (OAuth tokens, lookup cache, in-flight leases).
+# "sqlite:///uhc_state.db" (relative) or "sqlite:////var/lib/uhc/state.db" (absolute) for replicas
+# on one host or a shared volume, "redis://host:6379/0" for replicas on different hosts
+# (requires the redis package), or "memory://" for a process-local stand-in.
+UHC_SHARED_STATE_URL = ""
+UHC_SHARED_TOKEN_LEASE_TTL = 30.0   # seconds one replica may hold the token refresh lease
+UHC_INFLIGHT_LEASE_TTL = 35.0       # seconds other callers wait on an in-flight lookup of the same member
+# Secret for the store's keys (defaults to UHC_CLIENT_SECRET; must match on every replica)
+# UHC_SHARED_STATE_SECRET = "a-long-random-string"
+
+# Optional: pre-flight checks before lookups go upstream
+UHC_MEMBER_ID_PATTERN = r"^[A-Za-z0-9-]{5,20}$"   # member IDs not matching are rejected locally
+UHC_NEGATIVE_CACHE_TTL = 600                      # seconds a definitive 4xx answer is reused for the same request
+UHC_NEGATIVE_CACHE_MAX_ENTRIES = 2000
+
+# Optional: connection pooling and startup warm-up
+UHC_HTTP_POOL_SIZE = 16        # keep-alive connections kept open per UHC host
+UHC_WARMUP = True              # warm imports, caches, token and connections once per process
+UHC_WARMUP_CONNECTIONS = 4     # connections opened per host during warm-up
+
+# Optional: plan-level cache shared by members of the same payer/group/plan
+UHC_PLAN_CACHE_TTL = 604800          # seconds (7 days)
+UHC_PLAN_CACHE_MAX_ENTRIES = 2000
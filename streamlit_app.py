@@ -5,6 +5,25 @@ import time
 from datetime import datetime, timedelta
 import base64
 import os
+import re
+import sys
+import csv
+import io
+import hashlib
+import cProfile
+import pstats
+import marshal
+import functools
+import mmap
+import hmac
+import secrets
+import sqlite3
+import struct
+import uuid
+import zlib
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Import configuration
 try:
@@ -29,24 +48,654 @@ except ImportError:
         st.info("For local development: Create a config.py file based on config_example.py")
         st.stop()
 
-def save_token_to_file(token, expires_at):
-    """Save OAuth token to local file for persistence"""
+def get_setting(name, default=None, cast=None):
+    """Look up an optional setting in config.py, then Streamlit secrets, then environment variables"""
+    value = None
+    try:
+        import config
+        value = getattr(config, name, None)
+    except ImportError:
+        pass
+
+    if value is None:
+        try:
+            value = st.secrets[name]
+        except (KeyError, FileNotFoundError):
+            value = os.getenv(name)
+
+    if value is None or value == "":
+        return default
+    if cast is bool and isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    try:
+        return cast(value) if cast else value
+    except (TypeError, ValueError):
+        return default
+
+# Keep-alive connections to UHC, shared by every session and background thread
+HTTP_POOL_SIZE = get_setting("UHC_HTTP_POOL_SIZE", 16, int)   # connections kept open per host
+
+@st.cache_resource
+def get_http_session():
+    """Process-wide HTTP session, so requests reuse open TLS connections instead of handshaking each time"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Request hedging for the idempotent read endpoints (off by default)
+HEDGE_ENABLED = get_setting("UHC_HEDGE_ENABLED", False, bool)
+HEDGE_PERCENTILE = get_setting("UHC_HEDGE_PERCENTILE", 95.0, float)   # hedge after this percentile of recent latency
+HEDGE_MAX_RATE = get_setting("UHC_HEDGE_MAX_RATE", 0.1, float)        # at most this fraction of requests get a hedge
+HEDGE_MIN_SAMPLES = get_setting("UHC_HEDGE_MIN_SAMPLES", 20, int)     # no hedging until this many latencies are known
+HEDGE_MIN_DELAY = get_setting("UHC_HEDGE_MIN_DELAY", 0.05, float)     # never hedge sooner than this (seconds)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+class HedgeTracker:
+    """Recent latencies, hedge budget and hedge win/loss counters shared by all sessions"""
+
+    def __init__(self, percentile, max_rate, min_samples, min_delay, window=200, burst=5.0):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.budget = burst
+        self.counters = {
+            'requests': 0,
+            'hedges_sent': 0,
+            'hedge_wins': 0,
+            'hedge_losses': 0,
+            'hedges_suppressed': 0,
+        }
+
+    def record_latency(self, endpoint, seconds):
+        with self.lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, endpoint):
+        """Seconds to wait before hedging, or None while there is too little latency history"""
+        with self.lock:
+            samples = list(self.latencies.get(endpoint, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(samples, self.percentile))
+
+    def start_request(self):
+        # Every request earns a fraction of a hedge so hedges can never exceed max_rate of traffic
+        with self.lock:
+            self.counters['requests'] += 1
+            self.budget = min(self.burst, self.budget + self.max_rate)
+
+    def try_acquire_hedge(self):
+        with self.lock:
+            if self.budget >= 1.0:
+                self.budget -= 1.0
+                self.counters['hedges_sent'] += 1
+                return True
+            self.counters['hedges_suppressed'] += 1
+            return False
+
+    def record_hedge_outcome(self, hedge_won):
+        with self.lock:
+            self.counters['hedge_wins' if hedge_won else 'hedge_losses'] += 1
+
+    def snapshot(self):
+        """Counters plus p50/p99 latency per endpoint"""
+        with self.lock:
+            counters = dict(self.counters)
+            latencies = {k: list(v) for k, v in self.latencies.items()}
+        counters['latency'] = {
+            endpoint: {
+                'samples': len(values),
+                'p50': percentile(values, 50),
+                'p99': percentile(values, 99),
+            }
+            for endpoint, values in latencies.items() if values
+        }
+        return counters
+
+@st.cache_resource
+def get_hedge_tracker():
+    """Process-wide hedge tracker, shared across sessions and reruns"""
+    return HedgeTracker(HEDGE_PERCENTILE, HEDGE_MAX_RATE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY)
+
+@st.cache_resource
+def get_request_executor():
+    """Thread pool used to run request attempts concurrently"""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="uhc-request")
+
+def _discard_response(future):
+    """Close the connection of an attempt whose result is no longer wanted"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def _is_good_attempt(future):
+    """An attempt that returned a response which isn't throttled or a server error"""
+    if future.exception() is not None:
+        return False
+    status_code = future.result().status_code
+    return status_code != 429 and status_code < 500
+
+def post_with_hedging(endpoint, url, headers, body, timeout=30, on_hedge=None):
+    """POST to an idempotent read endpoint, sending a second identical request if the first is slow.
+
+    The hedge is sent once the first attempt has been outstanding longer than the configured
+    percentile of recent latency for this endpoint. Whichever attempt succeeds first is returned
+    and the other is cancelled (or, if already on the wire, its response is discarded).
+    `on_hedge` is called just before a hedge is sent, e.g. to count it against a quota.
+    """
+    if not HEDGE_ENABLED:
+        return get_http_session().post(url, headers=headers, data=body, timeout=timeout)
+
+    tracker = get_hedge_tracker()
+    executor = get_request_executor()
+    tracker.start_request()
+
+    def attempt():
+        started = time.monotonic()
+        response = get_http_session().post(url, headers=headers, data=body, timeout=timeout)
+        tracker.record_latency(endpoint, time.monotonic() - started)
+        return response
+
+    primary = executor.submit(attempt)
+    delay = tracker.hedge_delay(endpoint)
+    if delay is None:
+        return primary.result()
+
+    done, _ = wait([primary], timeout=delay)
+    if done or not tracker.try_acquire_hedge():
+        return primary.result()
+
+    if on_hedge is not None:
+        on_hedge()
+    hedge = executor.submit(attempt)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        # Prefer a successful attempt; a fast 429/5xx or exception must not beat a slower good answer
+        winner = next((f for f in done if _is_good_attempt(f)), None)
+        if winner is not None:
+            tracker.record_hedge_outcome(hedge_won=winner is hedge)
+            for other in (primary, hedge):
+                if other is not winner:
+                    other.cancel()
+                    other.add_done_callback(_discard_response)
+            return winner.result()
+
+    # Both attempts failed: surface the primary's response, or the hedge's if the primary raised
+    tracker.record_hedge_outcome(hedge_won=False)
+    if primary.exception() is not None and hedge.exception() is None:
+        return hedge.result()
+    hedge.add_done_callback(_discard_response)
+    return primary.result()
+
+# Opt-in profiling of script reruns and request functions
+PROFILING_ENABLED = get_setting("UHC_PROFILING", False, bool)          # profile every session without the sidebar toggle
+PROFILE_BUFFER_SIZE = get_setting("UHC_PROFILE_BUFFER_SIZE", 20, int)   # keep this many recent profiles
+
+# Buckets for the "time by area" breakdown, matched against a function's file and name
+PROFILE_AREAS = (
+    ('UHC API call', ('/requests/', '/urllib3/', '/ssl.py', '/socket.py', '/http/client.py')),
+    ('JSON decode', ('/json/', 'decode_response', '_convert')),
+    ('Date formatting', ('format_date_to_us', '_strptime')),
+    ('pandas', ('/pandas/',)),
+    ('Streamlit', ('/streamlit/',)),
+)
+
+_profiling = threading.local()
+
+class ProfileBuffer:
+    """Bounded buffer of recent profiles, shared across sessions"""
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.profiles = deque(maxlen=size)
+        self.next_id = 1
+
+    def add(self, kind, name, duration, stats):
+        entry = {
+            'kind': kind,
+            'name': name,
+            'recorded_at': datetime.now(),
+            'duration': duration,
+            # Same bytes pstats.Stats.dump_stats() writes, so the file loads in pstats/snakeviz
+            'pstats': marshal.dumps(stats.stats),
+            'folded': folded_stacks(stats),
+            'top_functions': top_functions(stats),
+            'areas': time_by_area(stats),
+        }
+        with self.lock:
+            entry['id'] = self.next_id
+            self.next_id += 1
+            self.profiles.append(entry)
+
+    def list(self):
+        with self.lock:
+            return list(reversed(self.profiles))
+
+@st.cache_resource
+def get_profile_buffer():
+    """Process-wide buffer of recent profiles"""
+    return ProfileBuffer(PROFILE_BUFFER_SIZE)
+
+def _function_label(func):
+    filename, line, name = func
+    return name if filename == '~' else f"{name} ({os.path.basename(filename)}:{line})"
+
+def top_functions(stats, limit=25):
+    """Rows for the functions with the most cumulative time"""
+    rows = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            'Function': _function_label(func),
+            'Calls': nc,
+            'Self (s)': round(tt, 4),
+            'Cumulative (s)': round(ct, 4),
+            'Per Call (ms)': round(ct / nc * 1000, 3) if nc else 0.0,
+        })
+    rows.sort(key=lambda row: row['Cumulative (s)'], reverse=True)
+    return rows[:limit]
+
+def time_by_area(stats):
+    """Self time grouped into the areas we care about (HTTP, decode, dates, pandas, Streamlit)"""
+    areas = {name: 0.0 for name, _ in PROFILE_AREAS}
+    areas['Other'] = 0.0
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        location = f"{filename.replace(os.sep, '/')}:{name}"
+        area = next((area_name for area_name, patterns in PROFILE_AREAS
+                     if any(pattern in location for pattern in patterns)), 'Other')
+        areas[area] += tt
+    return {name: round(seconds, 4) for name, seconds in areas.items()}
+
+def folded_stacks(stats, max_depth=40):
+    """Collapsed stacks ("a;b;c <microseconds>") for flamegraph.pl or speedscope.
+
+    cProfile only records caller/callee pairs, so stacks are rebuilt by walking the call graph
+    from the root functions and splitting each function's time across its callees. Calls with a
+    negligible share of the total time are folded into their caller to keep the walk bounded.
+    """
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    labels = {func: _function_label(func).replace(';', ',') for func in stats.stats}
+    min_seconds = stats.total_tt / 5000.0
+    # Roots are functions entered from outside the profile: no recorded callers, or time not covered by them
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        outside_seconds = ct - sum(edge[3] for edge in callers.values())
+        if outside_seconds >= min_seconds:
+            roots.append((func, outside_seconds))
+
+    lines = {}
+
+    def walk(func, path, seconds):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        path = path + [labels[func]]
+        self_time = min(seconds, tt * seconds / ct) if ct else seconds
+
+        # Recursion makes cumulative times overlap, so never hand children more than this frame has left
+        children = callees.get(func, ())
+        children_total = sum(edge for _, edge in children)
+        share = min(1.0, (seconds - self_time) / children_total) if children_total else 0.0
+        drawn = 0.0
+        for callee, edge in children:
+            child_seconds = edge * share
+            # Children too small or too deep to draw stay in this frame so totals still add up
+            if child_seconds >= min_seconds and len(path) < max_depth:
+                walk(callee, path, child_seconds)
+                drawn += child_seconds
+
+        key = ';'.join(path)
+        lines[key] = lines.get(key, 0.0) + seconds - drawn
+
+    for root, seconds in roots:
+        walk(root, [], seconds)
+    return '\n'.join(f"{stack} {int(seconds * 1_000_000)}" for stack, seconds in lines.items()
+                     if seconds >= 0.000001)
+
+def is_profiling_enabled():
+    """Profiling is on for every session via UHC_PROFILING, or per session via the sidebar toggle"""
+    return PROFILING_ENABLED or st.session_state.get('profiling_enabled', False)
+
+def start_profiler(profiler):
+    """Enable a profiler; False if another one is active, since Python 3.12+ allows one per process"""
+    try:
+        profiler.enable()
+        return True
+    except ValueError:
+        return False
+
+def run_profiled_rerun(script):
+    """Run the script, recording a profile of the whole rerun when profiling is enabled"""
+    if not is_profiling_enabled():
+        return script()
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    if not start_profiler(profiler):
+        # Another session is being profiled right now; skip this rerun
+        return script()
+    _profiling.active = profiler
+    _profiling.request_profiles = []
+    try:
+        return script()
+    finally:
+        profiler.disable()
+        _profiling.active = None
+        stats = pstats.Stats(profiler)
+        # Request functions are profiled separately; fold them back in so the rerun is complete
+        for request_profiler in _profiling.request_profiles:
+            stats.add(request_profiler)
+        get_profile_buffer().add('rerun', 'Script rerun', time.perf_counter() - started, stats)
+
+def profiled(func):
+    """Record a separate profile for each call of a request function while profiling is on"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(_profiling, 'active', None)
+        if outer is None and not PROFILING_ENABLED and not getattr(_profiling, 'requests', False):
+            return func(*args, **kwargs)
+
+        # Only one profiler can be active per thread, so pause the rerun profiler meanwhile
+        if outer is not None:
+            outer.disable()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        if not start_profiler(profiler):
+            # Another thread holds the process-wide profiler; run this call unprofiled
+            profiler = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                get_profile_buffer().add('request', func.__name__, time.perf_counter() - started, pstats.Stats(profiler))
+                if outer is not None:
+                    _profiling.request_profiles.append(profiler)
+            if outer is not None:
+                start_profiler(outer)
+    return wrapper
+
+def display_profiles():
+    """Top-functions table and downloads for the recorded profiles"""
+    profiles = get_profile_buffer().list()
+    with st.expander(f"🔬 Profiles ({len(profiles)})", expanded=False):
+        if not profiles:
+            st.info("No profiles recorded yet. Profiles appear after the next rerun.")
+            return
+
+        labels = {
+            p['id']: f"#{p['id']} {p['kind']}: {p['name']} - {p['duration'] * 1000:.0f} ms at {p['recorded_at'].strftime('%H:%M:%S')}"
+            for p in profiles
+        }
+        selected_id = st.selectbox("Profile", list(labels), format_func=labels.get)
+        profile = next(p for p in profiles if p['id'] == selected_id)
+
+        st.markdown("#### ⏱️ Time by Area")
+        area_cols = st.columns(len(profile['areas']))
+        for col, (area, seconds) in zip(area_cols, profile['areas'].items()):
+            col.metric(area, f"{seconds * 1000:.0f} ms")
+
+        st.markdown("#### 🔝 Top Functions")
+        st.dataframe(profile['top_functions'], use_container_width=True)
+
+        stamp = profile['recorded_at'].strftime('%Y%m%d-%H%M%S')
+        dl_col1, dl_col2 = st.columns(2)
+        with dl_col1:
+            st.download_button("⬇️ Download pstats (.prof)", data=profile['pstats'],
+                               file_name=f"{profile['kind']}-{stamp}-{profile['id']}.prof",
+                               mime="application/octet-stream")
+        with dl_col2:
+            st.download_button("⬇️ Download flame graph stacks (.folded)", data=profile['folded'],
+                               file_name=f"{profile['kind']}-{stamp}-{profile['id']}.folded",
+                               mime="text/plain")
+
+# Optional state shared by all app replicas: OAuth tokens, the lookup cache and in-flight leases.
+# sqlite:///path/to/uhc_state.db for replicas on one host or a shared volume, redis://host:6379/0
+# for replicas on different hosts, or memory:// for a process-local stand-in
+SHARED_STATE_URL = get_setting("UHC_SHARED_STATE_URL", "")
+SHARED_TOKEN_LEASE_TTL = get_setting("UHC_SHARED_TOKEN_LEASE_TTL", 30.0, float)   # seconds one replica may spend minting
+INFLIGHT_LEASE_TTL = get_setting("UHC_INFLIGHT_LEASE_TTL", 35.0, float)           # a little over the request timeout
+# Keys store entries; every replica must use the same value
+SHARED_STATE_SECRET = get_setting("UHC_SHARED_STATE_SECRET", UHC_CLIENT_SECRET)
+
+class MemoryStateBackend:
+    """Process-local stand-in for a shared store, for single replicas and local testing"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def _live(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.entries[key]
+            entry = None
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def acquire_lease(self, name, owner, ttl):
+        with self.lock:
+            now = time.time()
+            if self._live(name, now) is not None:
+                return False
+            self.entries[name] = (owner.encode(), now + ttl)
+            return True
+
+    def release_lease(self, name, owner):
+        with self.lock:
+            entry = self._live(name, time.time())
+            if entry is not None and entry[0] == owner.encode():
+                del self.entries[name]
+
+class SQLiteStateBackend:
+    """Shared store in a SQLite database in WAL mode; every operation is a single atomic statement"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.writes = 0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + ttl if ttl else None)
+        )
+        self.writes += 1
+        if self.writes % 1000 == 0:
+            conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE shared_state.expires_at <= ?",
+            (name, owner.encode(), now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name, owner):
+        self._connection().execute("DELETE FROM shared_state WHERE key = ? AND value = ?", (name, owner.encode()))
+
+class RedisStateBackend:
+    """Shared store in Redis, or any server speaking the Redis protocol"""
+
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("UHC_SHARED_STATE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url, socket_timeout=2.0)
+        self.release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def acquire_lease(self, name, owner, ttl):
+        return bool(self.client.set(name, owner, nx=True, px=int(ttl * 1000)))
+
+    def release_lease(self, name, owner):
+        self.release(keys=[name], args=[owner])
+
+class SharedState:
+    """Key/value store with expiring leases; backend errors degrade to per-replica behaviour"""
+
+    def __init__(self, backend, description):
+        self.backend = backend
+        self.description = description
+        self.lock = threading.Lock()
+        self.errors = 0
+        self.last_error = None
+
+    def _call(self, default, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                self.last_error = f"{method}: {e}"
+            return default
+
+    def get(self, key):
+        return self._call(None, 'get', key)
+
+    def set(self, key, value, ttl=None):
+        self._call(None, 'set', key, value, ttl)
+
+    def delete(self, key):
+        self._call(None, 'delete', key)
+
+    def acquire_lease(self, name, owner, ttl):
+        """Whether `owner` now holds the lease; if the store is unreachable, act as if it does"""
+        return self._call(True, 'acquire_lease', name, owner, ttl)
+
+    def release_lease(self, name, owner):
+        self._call(None, 'release_lease', name, owner)
+
+@st.cache_resource
+def get_shared_state():
+    """Store shared by all replicas, or None when UHC_SHARED_STATE_URL isn't set"""
+    if not SHARED_STATE_URL:
+        return None
+    scheme, _, rest = SHARED_STATE_URL.partition('://')
+    if scheme == 'sqlite':
+        # Like SQLAlchemy: sqlite:///relative.db, sqlite:////absolute/path.db
+        path = rest[1:] if rest.startswith('/') else rest
+        return SharedState(SQLiteStateBackend(path), f"SQLite ({path})")
+    if scheme in ('redis', 'rediss', 'unix'):
+        return SharedState(RedisStateBackend(SHARED_STATE_URL), f"Redis ({SHARED_STATE_URL.split('@')[-1]})")
+    if scheme == 'memory':
+        return SharedState(MemoryStateBackend(), "In-process memory")
+    raise ValueError(f"Unsupported UHC_SHARED_STATE_URL scheme: {scheme}")
+
+@st.cache_resource
+def get_lease_store():
+    """Where leases live: the shared store, or this process alone when there is none"""
+    return get_shared_state() or SharedState(MemoryStateBackend(), "In-process memory")
+
+def shared_key(kind, value):
+    """Store key that doesn't reveal member IDs or client IDs, even to someone who can guess them"""
+    digest = hmac.new(str(SHARED_STATE_SECRET or '').encode('utf-8'), value.encode('utf-8'), hashlib.sha256)
+    return f"uhc:{kind}:{digest.hexdigest()}"
+
+def save_token_to_file(token, expires_at, token_file=None, client_id=None, share=True):
+    """Save OAuth token to local file for persistence, and with `share` to the shared store if there is one"""
+    token_file = token_file or TOKEN_FILE
     try:
         token_data = {
             'oauth_token': token,
             'expires_at': expires_at.isoformat() if expires_at else None,
             'saved_at': datetime.now().isoformat()
         }
-        with open(TOKEN_FILE, 'w') as f:
+        shared = get_shared_state() if share else None
+        if shared is not None and expires_at:
+            ttl = (expires_at - datetime.now()).total_seconds()
+            if ttl > 0:
+                shared.set(shared_key('token', client_id or UHC_CLIENT_ID), json.dumps(token_data).encode('utf-8'), ttl)
+        
+        # Write a temp file and rename it, so readers never see a half-written token
+        temp_file = f"{token_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w') as f:
             json.dump(token_data, f)
+        os.replace(temp_file, token_file)
     except Exception as e:
         st.warning(f"Could not save token to file: {str(e)}")
 
-def load_token_from_file():
-    """Load OAuth token from local file"""
+def load_token_from_file(token_file=None, client_id=None):
+    """Load OAuth token from the shared store if there is one, else from the local file"""
+    token_file = token_file or TOKEN_FILE
+    shared = get_shared_state()
+    if shared is not None:
+        key = shared_key('token', client_id or UHC_CLIENT_ID)
+        raw = shared.get(key)
+        if raw:
+            try:
+                token_data = json.loads(raw)
+                expires_at = datetime.fromisoformat(token_data['expires_at'])
+                if datetime.now() + timedelta(minutes=5) < expires_at:
+                    return token_data['oauth_token'], expires_at
+            except (ValueError, TypeError, KeyError):
+                # Unreadable entry; drop it so the next mint replaces it, and fall back to the local file
+                shared.delete(key)
     try:
-        if os.path.exists(TOKEN_FILE):
-            with open(TOKEN_FILE, 'r') as f:
+        if os.path.exists(token_file):
+            with open(token_file, 'r') as f:
                 token_data = json.load(f)
             
             oauth_token = token_data.get('oauth_token')
@@ -60,7 +709,7 @@ def load_token_from_file():
                     return oauth_token, expires_at
                 else:
                     # Token expired, remove the file
-                    os.remove(TOKEN_FILE)
+                    os.remove(token_file)
                     return None, None
             
     except Exception as e:
@@ -68,29 +717,40 @@ def load_token_from_file():
     
     return None, None
 
-def delete_token_file():
-    """Delete the token file"""
+def delete_token_file(token_file=None, client_id=None):
+    """Delete the token file and the shared copy of the token"""
+    token_file = token_file or TOKEN_FILE
+    shared = get_shared_state()
+    if shared is not None:
+        shared.delete(shared_key('token', client_id or UHC_CLIENT_ID))
     try:
-        if os.path.exists(TOKEN_FILE):
-            os.remove(TOKEN_FILE)
+        if os.path.exists(token_file):
+            os.remove(token_file)
     except Exception as e:
         st.warning(f"Could not delete token file: {str(e)}")
 
-# Initialize session state for token management
-# Try to load existing token first
-if 'oauth_token' not in st.session_state:
+def load_session_token():
+    """Make the saved token (from this replica's file or the shared store) the session's token"""
     saved_token, saved_expires = load_token_from_file()
     st.session_state.oauth_token = saved_token
     st.session_state.token_expires_at = saved_expires
     st.session_state.token_generated = saved_token is not None
 
+# Initialize session state for token management
+# Try to load existing token first
+if 'oauth_token' not in st.session_state:
+    load_session_token()
+
 if 'token_expires_at' not in st.session_state:
     st.session_state.token_expires_at = None
 if 'token_generated' not in st.session_state:
     st.session_state.token_generated = False
 
-def generate_oauth_token():
-    """Generate OAuth token using client credentials - matches Postman implementation"""
+def fetch_oauth_token(client_id=None, client_secret=None):
+    """Request a new OAuth token using client credentials - matches Postman implementation.
+
+    Doesn't touch session state, so it can also be used from background threads.
+    """
     try:
         # Use the exact format that works in Postman
         url = "https://apimarketplace.uhc.com/v1/oauthtoken"
@@ -103,33 +763,26 @@ def generate_oauth_token():
         
         # Body as JSON with client credentials
         payload = {
-            'client_id': UHC_CLIENT_ID,
-            'client_secret': UHC_CLIENT_SECRET,
+            'client_id': client_id or UHC_CLIENT_ID,
+            'client_secret': client_secret or UHC_CLIENT_SECRET,
             'grant_type': 'client_credentials'
         }
         
         # Make the request
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = get_http_session().post(url, headers=headers, json=payload, timeout=30)
         
         if response.status_code == 200:
             token_data = response.json()
             access_token = token_data.get('access_token')
             expires_in = int(token_data.get('expires_in', 3599))
             
-            # Store token and expiration time in session state
-            st.session_state.oauth_token = f"Bearer {access_token}"
-            st.session_state.token_expires_at = datetime.now() + timedelta(seconds=expires_in)
-            st.session_state.token_generated = True
-            
-            # Save token to file for persistence
-            save_token_to_file(st.session_state.oauth_token, st.session_state.token_expires_at)
-            
             return {
                 'success': True,
-                'token': st.session_state.oauth_token,
-                'expires_at': st.session_state.token_expires_at,
+                'token': f"Bearer {access_token}",
+                'expires_at': datetime.now() + timedelta(seconds=expires_in),
                 'data': token_data,
-                'method': 'Postman-style JSON request'
+                'method': 'Postman-style JSON request',
+                'elapsed': response.elapsed.total_seconds()
             }
         else:
             return {
@@ -145,6 +798,64 @@ def generate_oauth_token():
             'status_code': 500
         }
 
+def obtain_oauth_token(client_id=None, client_secret=None, token_file=None, reuse=True):
+    """Mint and save a token while holding the refresh lease, so only one replica calls the token endpoint.
+
+    Replicas that don't get the lease wait for the holder's token instead. With `reuse`, a valid
+    saved token is returned without minting.
+    """
+    leases = get_lease_store()
+    lease = shared_key('token-lease', client_id or UHC_CLIENT_ID)
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + SHARED_TOKEN_LEASE_TTL
+    while True:
+        if reuse:
+            token, expires_at = load_token_from_file(token_file, client_id)
+            if token:
+                return {'success': True, 'token': token, 'expires_at': expires_at, 'method': 'Saved token'}
+        
+        if leases.acquire_lease(lease, owner, SHARED_TOKEN_LEASE_TTL):
+            break
+        if time.monotonic() >= deadline:
+            # The lease holder is taking too long; mint without it
+            owner = None
+            break
+        time.sleep(0.2)
+        # Whatever the lease holder mints is new enough, even when asked not to reuse
+        reuse = True
+    
+    try:
+        if reuse:
+            # Another replica may have saved a token between our last check and taking the lease
+            token, expires_at = load_token_from_file(token_file, client_id)
+            if token:
+                return {'success': True, 'token': token, 'expires_at': expires_at, 'method': 'Saved token'}
+        
+        result = fetch_oauth_token(client_id, client_secret)
+        if result['success']:
+            save_token_to_file(result['token'], result['expires_at'], token_file, client_id)
+        return result
+    finally:
+        if owner is not None:
+            leases.release_lease(lease, owner)
+
+def generate_oauth_token():
+    """Mint a new token and make it the current session's token"""
+    result = obtain_oauth_token(reuse=False)
+    
+    if result['success']:
+        # Store token and expiration time in session state; it is already saved for other sessions
+        st.session_state.oauth_token = result['token']
+        st.session_state.token_expires_at = result['expires_at']
+        st.session_state.token_generated = True
+    
+    return result
+
+def get_background_token():
+    """Token for work outside a browser session: the saved token, or a freshly minted one"""
+    result = obtain_oauth_token()
+    return result['token'] if result['success'] else None
+
 def is_token_valid():
     """Check if the current token is still valid"""
     if not st.session_state.oauth_token or not st.session_state.token_expires_at:
@@ -154,21 +865,850 @@ def is_token_valid():
     buffer_time = timedelta(minutes=5)
     return datetime.now() + buffer_time < st.session_state.token_expires_at
 
-def get_api_headers():
-    """Get headers for API requests"""
+def get_api_headers(token=None, client_id=None):
+    """Get headers for API requests, using the session's token unless one is given"""
     return {
-        'Authorization': st.session_state.oauth_token,
+        'Authorization': token or st.session_state.oauth_token,
         'Content-Type': 'application/json',
         'Accept': 'application/json',
-        'X-API-Key': UHC_CLIENT_ID,
-        'Client-Id': UHC_CLIENT_ID,
+        'X-API-Key': client_id or UHC_CLIENT_ID,
+        'Client-Id': client_id or UHC_CLIENT_ID,
         'env': 'production'  # Changed from 'sandbox' to 'production'
     }
 
+# Optional pool of client credentials to spread requests across, e.g. in config.py:
+#   UHC_CREDENTIALS = [{"name": "desk", "client_id": "...", "client_secret": "..."}, ...]
+# or as a JSON list in the UHC_CREDENTIALS environment variable
+UHC_CREDENTIALS = get_setting("UHC_CREDENTIALS", [])
+if isinstance(UHC_CREDENTIALS, str):
+    try:
+        UHC_CREDENTIALS = json.loads(UHC_CREDENTIALS)
+    except ValueError:
+        UHC_CREDENTIALS = []
+CREDENTIAL_POOL_ENABLED = bool(UHC_CREDENTIALS)
+CREDENTIAL_QUOTA_PER_MINUTE = get_setting("UHC_CREDENTIAL_QUOTA_PER_MINUTE", 0, int)   # 0 means no local quota
+CREDENTIAL_MAX_FAILURES = 3          # consecutive failures before a credential is taken out of rotation
+CREDENTIAL_FAILURE_COOLDOWN = 60     # seconds an unhealthy credential sits out
+CREDENTIAL_THROTTLE_BACKOFF = 30     # seconds a throttled credential is drained for, doubling on repeats
+CREDENTIAL_MAX_THROTTLE_BACKOFF = 300
+
+class PooledCredential:
+    """One client ID/secret pair with its own token lifecycle, quota counters and health state"""
+
+    def __init__(self, name, client_id, client_secret, token_file, quota_per_minute):
+        self.name = name
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_file = token_file
+        self.quota_per_minute = quota_per_minute
+        self.lock = threading.Lock()
+        self.token = None
+        self.expires_at = None
+        self.recent_requests = deque()
+        self.in_flight = 0
+        self.total_requests = 0
+        self.throttled_count = 0
+        self.consecutive_throttles = 0
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+        self.last_error = None
+
+    def get_token(self):
+        """Valid bearer token for this credential, loading or minting one as needed"""
+        with self.lock:
+            if self.token and self.expires_at and datetime.now() + timedelta(minutes=5) < self.expires_at:
+                return self.token
+
+            result = obtain_oauth_token(self.client_id, self.client_secret, self.token_file)
+            if not result['success']:
+                raise RuntimeError(f"Could not get token for credential '{self.name}': {result['error']}")
+
+            self.token, self.expires_at = result['token'], result['expires_at']
+            return self.token
+
+    def invalidate_token(self):
+        with self.lock:
+            self.token = None
+            self.expires_at = None
+        delete_token_file(self.token_file, self.client_id)
+
+    def requests_last_minute(self, now):
+        while self.recent_requests and now - self.recent_requests[0] > 60:
+            self.recent_requests.popleft()
+        return len(self.recent_requests)
+
+    def is_available(self, now):
+        if now < self.unavailable_until:
+            return False
+        return not self.quota_per_minute or self.requests_last_minute(now) < self.quota_per_minute
+
+class CredentialPool:
+    """Spreads requests across healthy credentials and drains throttled ones"""
+
+    def __init__(self, credentials, max_wait=10.0):
+        self.credentials = credentials
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """Least-loaded available credential, waiting briefly if all are throttled or at quota"""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self.lock:
+                now = time.time()
+                candidates = [c for c in self.credentials if c not in exclude] or self.credentials
+                available = [c for c in candidates if c.is_available(now)]
+                if available or time.monotonic() >= deadline:
+                    # Out of options: use whichever credential comes back soonest
+                    credential = min(available, key=lambda c: (c.in_flight, c.requests_last_minute(now))) \
+                        if available else min(candidates, key=lambda c: c.unavailable_until)
+                    credential.in_flight += 1
+                    credential.total_requests += 1
+                    credential.recent_requests.append(now)
+                    return credential
+            time.sleep(0.1)
+
+    def count_request(self, credential):
+        """Count an extra request sent with an acquired credential, such as a hedged second attempt"""
+        with self.lock:
+            credential.total_requests += 1
+            credential.recent_requests.append(time.time())
+
+    def release(self, credential, status_code, retry_after=None, error=None):
+        """Record the outcome of a request made with `credential`"""
+        with self.lock:
+            now = time.time()
+            credential.in_flight -= 1
+            if status_code == 429:
+                credential.throttled_count += 1
+                credential.consecutive_throttles += 1
+                backoff = CREDENTIAL_THROTTLE_BACKOFF * 2 ** (credential.consecutive_throttles - 1)
+                try:
+                    backoff = max(backoff, float(retry_after)) if retry_after else backoff
+                except ValueError:
+                    pass
+                credential.unavailable_until = now + min(backoff, CREDENTIAL_MAX_THROTTLE_BACKOFF)
+                credential.last_error = "Throttled (429)"
+            elif status_code is None or status_code >= 500:
+                credential.consecutive_failures += 1
+                credential.last_error = error or f"Status {status_code}"
+                if credential.consecutive_failures >= CREDENTIAL_MAX_FAILURES:
+                    credential.unavailable_until = now + CREDENTIAL_FAILURE_COOLDOWN
+            else:
+                credential.consecutive_throttles = 0
+                credential.consecutive_failures = 0
+        if status_code == 401:
+            # Token was rejected; mint a fresh one on next use
+            credential.invalidate_token()
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            return [
+                {
+                    'name': c.name,
+                    'client_id': f"{c.client_id[:6]}..." if c.client_id else '',
+                    'state': 'healthy' if now >= c.unavailable_until
+                             else f"drained for {int(c.unavailable_until - now)}s",
+                    'token_expires': c.expires_at.strftime('%H:%M:%S') if c.expires_at else '',
+                    'last_minute': c.requests_last_minute(now),
+                    'quota': c.quota_per_minute or None,
+                    'in_flight': c.in_flight,
+                    'total': c.total_requests,
+                    'throttled': c.throttled_count,
+                    'last_error': c.last_error or '',
+                }
+                for c in self.credentials
+            ]
+
+def credential_token_file(name, client_id):
+    """Token file for a pooled credential; the primary credential keeps using TOKEN_FILE"""
+    if client_id == UHC_CLIENT_ID:
+        return TOKEN_FILE
+    base, ext = os.path.splitext(TOKEN_FILE)
+    safe_name = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in name)
+    return f"{base}_{safe_name}{ext or '.json'}"
+
+@st.cache_resource
+def get_credential_pool():
+    """Process-wide credential pool built from UHC_CREDENTIALS"""
+    credentials = []
+    for idx, entry in enumerate(UHC_CREDENTIALS):
+        entry = dict(entry)
+        name = str(entry.get('name') or f"credential-{idx + 1}")
+        credentials.append(PooledCredential(
+            name,
+            entry['client_id'],
+            entry['client_secret'],
+            credential_token_file(name, entry['client_id']),
+            int(entry.get('quota_per_minute', CREDENTIAL_QUOTA_PER_MINUTE) or 0),
+        ))
+    return CredentialPool(credentials)
+
+def send_api_request(endpoint, url, payload, token=None, timeout=30):
+    """POST a read request, recording it to or replaying it from the cassette when that mode is on"""
+    if CASSETTE_MODE == 'replay':
+        return get_cassette().replay(endpoint)
+
+    started = time.monotonic()
+    response = send_upstream_request(endpoint, url, payload, token=token, timeout=timeout)
+    if CASSETTE_MODE == 'record':
+        get_cassette().record(endpoint, response, time.monotonic() - started)
+    return response
+
+def send_upstream_request(endpoint, url, payload, token=None, timeout=30):
+    """POST a read request, using the credential pool unless a token is given or no pool is configured"""
+    body = json.dumps(payload)
+    if token or not CREDENTIAL_POOL_ENABLED:
+        return post_with_hedging(endpoint, url, get_api_headers(token), body, timeout=timeout)
+
+    pool = get_credential_pool()
+    throttled = []
+    retried_auth = False
+    while True:
+        credential = pool.acquire(exclude=throttled)
+        try:
+            headers = get_api_headers(credential.get_token(), client_id=credential.client_id)
+            response = post_with_hedging(endpoint, url, headers, body, timeout=timeout,
+                                         on_hedge=functools.partial(pool.count_request, credential))
+        except Exception as e:
+            pool.release(credential, None, error=str(e))
+            raise
+        pool.release(credential, response.status_code, response.headers.get('Retry-After'))
+        if response.status_code == 401 and not retried_auth:
+            # release() dropped the rejected token, so the retry runs with a freshly minted one
+            retried_auth = True
+            continue
+        if response.status_code == 429 and not throttled and len(pool.credentials) > 1:
+            # A throttled credential is drained and the request retried once on another one
+            throttled.append(credential)
+            continue
+        return response
+
+# Record/replay of API responses for repeatable benchmarks, with PII scrubbed before anything is written
+CASSETTE_MODE = (get_setting("UHC_CASSETTE_MODE", "") or "").lower()          # "record", "replay" or empty
+CASSETTE_FILE = get_setting("UHC_CASSETTE_FILE", "uhc_cassette.jsonl")
+CASSETTE_REPLAY_LATENCY = get_setting("UHC_CASSETTE_REPLAY_LATENCY", False, bool)   # sleep for the recorded latency
+CASSETTE_LATENCY_SCALE = get_setting("UHC_CASSETTE_LATENCY_SCALE", 1.0, float)
+
+# Field names are matched case-insensitively. Only string values of fields on the safe list are
+# written as received; every other string, and numbers in PHI fields, are synthesized.
+CASSETTE_SAFE_FIELDS = {
+    'searchstatus', 'policystatus', 'coveragetype', 'coveragetypecode', 'coveragetypedescription',
+    'insurancetype', 'insurancetypecode', 'insurancetypedescription', 'lineofbusiness', 'lineofbusinesscode',
+    'payername', 'payerstatus', 'plandescription', 'plantype', 'plantypecode', 'platform', 'fundingtype',
+    'found', 'planamount', 'planamountfrequency', 'remainingamount', 'metytdamount', 'metyeartodateamount',
+    'copayamount', 'coinsurancepercent', 'networkstatus', 'networkstatuscode', 'tierdescription',
+    'coveragelevel', 'timeperiodqualifier',
+}
+# Swagger properties matching this are PHI: identifiers, names, addresses, contact details and birth dates
+CASSETTE_PHI_PATTERN = re.compile(
+    r"firstname|lastname|middlename|namesuffix|holdername|^name$|memberid|subscriberid|patientkey|enrollee"
+    r"|identifier|alternateid|surrogateid|consumerid|recipientid|exchangeid|xrefid|policynumber|^mbi$|ssn"
+    r"|taxid|^tin$|address|street|city|^state$|zip|countrycode|countrysubdivision|phone|fax|email"
+    r"|dateofbirth|^dob$|birth|gender|transactionid"
+)
+CASSETTE_BASE_PHI_FIELDS = {'firstname', 'lastname', 'middlename', 'dateofbirth', 'dob', 'memberid', 'patientkey',
+                            'subscriberid', 'mbi', 'ssn', 'zip', 'zipcode', 'phone', 'email', 'transactionid'}
+CASSETTE_DROPPED_FIELDS = {'xmlresponses'}
+SYNTHETIC_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%Y%m%d')
+
+@st.cache_resource
+def get_cassette_phi_fields():
+    """Lower-cased PHI field names: every matching property in the bundled swagger, plus a base set"""
+    fields = set(CASSETTE_BASE_PHI_FIELDS)
+    try:
+        with open(SWAGGER_FILE, 'rb') as f:
+            schemas = json.load(f)['components']['schemas']
+    except (OSError, ValueError, KeyError):
+        return fields
+    for schema in schemas.values():
+        for name in (schema.get('properties') or {}):
+            if CASSETTE_PHI_PATTERN.search(name.lower()):
+                fields.add(name.lower())
+    return fields
+
+def synthesize_value(field, value, secret):
+    """Deterministic stand-in for a PII value that keeps its length, character classes and date format"""
+    digest = hashlib.shake_256(hmac.new(secret, f"{field}|{value}".encode('utf-8'), hashlib.sha256).digest())
+    if value[:1].isdigit():
+        for fmt in SYNTHETIC_DATE_FORMATS:
+            try:
+                datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            offset = int.from_bytes(digest.digest(4), 'big') % 24000
+            return (datetime(1940, 1, 1) + timedelta(days=offset)).strftime(fmt)
+
+    noise = digest.digest(len(value))
+    synthesized = []
+    for ch, byte in zip(value, noise):
+        if ch.isdigit():
+            synthesized.append(str(byte % 10))
+        elif ch.isalpha():
+            letter = chr(ord('A') + byte % 26)
+            synthesized.append(letter if ch.isupper() else letter.lower())
+        else:
+            synthesized.append(ch)
+    return ''.join(synthesized)
+
+def scrub_pii(value, secret, field=None):
+    """Copy of a decoded JSON value with everything not known to be safe synthesized and free-text payloads dropped"""
+    if isinstance(value, dict):
+        return {
+            key: (type(item)() if isinstance(item, (list, dict, str)) else None) if key.lower() in CASSETTE_DROPPED_FIELDS
+            else scrub_pii(item, secret, key.lower())
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub_pii(item, secret, field) for item in value]
+    if isinstance(value, str) and value:
+        if field in CASSETTE_SAFE_FIELDS and field not in get_cassette_phi_fields():
+            return value
+        return synthesize_value(field or '', value, secret)
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and field in get_cassette_phi_fields():
+        # Numeric IDs and zip codes keep their type
+        return type(value)(synthesize_value(field, str(value), secret))
+    return value
+
+class Cassette:
+    """Append-only JSON-lines file of scrubbed responses, replayed through a memory map.
+
+    Each line starts with its endpoint, so replay can index the file without parsing bodies;
+    responses are replayed per endpoint in recorded order, cycling when they run out.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Per-process key: synthetic values stay consistent within a run but can't be reversed
+        self.secret = secrets.token_bytes(32)
+        self.recorded = 0
+        self.positions = {}
+        self.mapped = None
+        self.index = None
+
+    def record(self, endpoint, response, latency):
+        try:
+            body = scrub_pii(json.loads(response.content), self.secret)
+            is_json = True
+        except ValueError:
+            body = f"[non-JSON body of {len(response.content)} bytes removed]"
+            is_json = False
+        entry = {
+            'endpoint': endpoint,
+            'status_code': response.status_code,
+            'latency': round(latency, 4),
+            'json': is_json,
+            'recorded_at': datetime.now().isoformat(),
+            'body': body,
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.recorded += 1
+            self._close_map()
+
+    def _close_map(self):
+        if self.mapped is not None:
+            self.mapped.close()
+        self.mapped = None
+        self.index = None
+
+    def _load(self):
+        """Memory-map the cassette and index line offsets by endpoint"""
+        if self.index is not None:
+            return
+        self.index = {}
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix = b'{"endpoint":"'
+        start = 0
+        while start < len(self.mapped):
+            end = self.mapped.find(b'\n', start)
+            end = len(self.mapped) if end == -1 else end
+            if self.mapped[start:start + len(prefix)] == prefix:
+                name_end = self.mapped.find(b'"', start + len(prefix))
+                endpoint = self.mapped[start + len(prefix):name_end].decode('utf-8')
+                self.index.setdefault(endpoint, []).append((start, end))
+            start = end + 1
+
+    def entries(self, endpoint):
+        """All recorded entries for an endpoint"""
+        with self.lock:
+            self._load()
+            return [json.loads(self.mapped[start:end]) for start, end in self.index.get(endpoint, ())]
+
+    def counts(self):
+        with self.lock:
+            self._load()
+            return {endpoint: len(offsets) for endpoint, offsets in self.index.items()}
+
+    def replay(self, endpoint):
+        """Next recorded response for an endpoint as a requests.Response"""
+        with self.lock:
+            self._load()
+            offsets = self.index.get(endpoint)
+            if not offsets:
+                raise RuntimeError(f"No recorded '{endpoint}' responses in cassette {self.path}")
+            position = self.positions.get(endpoint, 0)
+            self.positions[endpoint] = position + 1
+            start, end = offsets[position % len(offsets)]
+            entry = json.loads(self.mapped[start:end])
+
+        if CASSETTE_REPLAY_LATENCY:
+            time.sleep(entry['latency'] * CASSETTE_LATENCY_SCALE)
+
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        body = entry['body']
+        response._content = json.dumps(body).encode('utf-8') if entry['json'] else body.encode('utf-8')
+        response.headers['Content-Type'] = 'application/json' if entry['json'] else 'text/plain'
+        response.encoding = 'utf-8'
+        return response
+
+@st.cache_resource
+def get_cassette():
+    """Process-wide cassette for record/replay mode"""
+    return Cassette(CASSETTE_FILE)
+
+def benchmark_cassette(iterations):
+    """Time decoding and rendering of every recorded eligibility response"""
+    bodies = [
+        json.dumps(entry['body']).encode('utf-8')
+        for entry in get_cassette().entries('eligibility')
+        if entry['status_code'] == 200 and entry['json']
+    ]
+    decode_times, render_times = [], []
+    placeholder = st.empty()
+    for _ in range(iterations):
+        for content in bodies:
+            started = time.perf_counter()
+            data = decode_response('EligibilityResponse', content)
+            decode_times.append(time.perf_counter() - started)
+
+            with placeholder.container():
+                started = time.perf_counter()
+                display_formatted_eligibility_results(data)
+                render_times.append(time.perf_counter() - started)
+    placeholder.empty()
+
+    if not bodies:
+        return None
+    return {
+        'responses': len(bodies),
+        'iterations': iterations,
+        'decode': {p: percentile(decode_times, p) for p in (50, 95, 99)},
+        'render': {p: percentile(render_times, p) for p in (50, 95, 99)},
+    }
+
+def display_cassette_benchmark():
+    """Benchmark controls and results for replay mode"""
+    with st.expander("📼 Cassette Benchmark", expanded=False):
+        iterations = st.number_input("Iterations", min_value=1, max_value=500, value=20)
+        if st.button("▶️ Run Benchmark"):
+            with st.spinner("Benchmarking recorded responses..."):
+                st.session_state.cassette_benchmark = benchmark_cassette(int(iterations))
+
+        results = st.session_state.get('cassette_benchmark')
+        if results is None and 'cassette_benchmark' in st.session_state:
+            st.warning("⚠️ No successful eligibility responses in the cassette")
+        elif results:
+            st.text(f"{results['responses']} responses x {results['iterations']} iterations")
+            st.dataframe([
+                {'Stage': stage, **{f"p{p} (ms)": round(results[key][p] * 1000, 3) for p in (50, 95, 99)}}
+                for stage, key in (('Decode', 'decode'), ('Render', 'render'))
+            ], use_container_width=True)
+
+# Swagger spec whose component schemas sampled responses are checked against
+SWAGGER_FILE = get_setting(
+    "UHC_SWAGGER_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "eligibility prod swagger (1).json")
+)
+SCHEMA_DRIFT_SAMPLE = get_setting("UHC_SCHEMA_DRIFT_SAMPLE", 20, int)   # check one response in this many
+
+# orjson parses responses about twice as fast as json and shares repeated keys; it's optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SCALAR_TYPES = {
+    'string': (str,),
+    'boolean': (bool,),
+    'integer': (int,),
+    'number': (int, float),
+}
+
+def parse_json(content):
+    """Parse JSON bytes into plain dicts and lists"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+class SchemaDriftLog:
+    """Counts of response fields that don't match the swagger schemas, shared across sessions"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def record(self, location, problem):
+        with self.lock:
+            entry = self.entries.setdefault((location, problem), {'count': 0, 'first_seen': datetime.now()})
+            entry['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                {'location': location, 'problem': problem, **entry}
+                for (location, problem), entry in sorted(self.entries.items())
+            ]
+
+class SchemaChecker:
+    """Walks a sample of decoded responses against the swagger component schemas, logging drift.
+
+    Checking is kept off most responses so it doesn't add to decode time on batch runs.
+    """
+
+    def __init__(self, schemas, drift_log, sample_every):
+        self.schemas = schemas
+        self.drift_log = drift_log
+        self.sample_every = max(1, sample_every)
+        self.specs = {}
+        self.lock = threading.Lock()
+        self.seen = 0
+
+    def _spec(self, node):
+        if '$ref' in node:
+            return ('ref', node['$ref'].rsplit('/', 1)[-1])
+        node_type = node.get('type')
+        if node_type == 'array':
+            return ('array', self._spec(node.get('items') or {}))
+        if node_type in SCALAR_TYPES:
+            return ('scalar', node_type)
+        return ('any', None)
+
+    def field_specs(self, name):
+        """Field specs of an object schema, built on first use"""
+        specs = self.specs.get(name)
+        if specs is None:
+            properties = self.schemas[name].get('properties') or {}
+            specs = {field: self._spec(node) for field, node in properties.items()}
+            with self.lock:
+                self.specs[name] = specs
+        return specs
+
+    def sample(self, schema_name, value):
+        """Check every `sample_every`-th response"""
+        with self.lock:
+            due = self.seen % self.sample_every == 0
+            self.seen += 1
+        if due:
+            self.check(value, ('ref', schema_name), schema_name)
+
+    def check(self, value, spec, location):
+        if value is None:
+            return
+        kind, detail = spec
+
+        if kind == 'ref':
+            schema = self.schemas.get(detail)
+            if schema is None:
+                return
+            if schema.get('type') == 'object' or 'properties' in schema:
+                self._check_object(value, detail)
+            else:
+                self.check(value, self._spec(schema), detail)
+        elif kind == 'array':
+            if not isinstance(value, list):
+                self.drift_log.record(location, f"expected array, got {type(value).__name__}")
+                return
+            for item in value:
+                self.check(item, detail, location)
+        elif kind == 'scalar':
+            expected = SCALAR_TYPES[detail]
+            if not isinstance(value, expected) or (detail != 'boolean' and isinstance(value, bool)):
+                self.drift_log.record(location, f"expected {detail}, got {type(value).__name__}")
+
+    def _check_object(self, value, schema_name):
+        if not isinstance(value, dict):
+            self.drift_log.record(schema_name, f"expected object, got {type(value).__name__}")
+            return
+        specs = self.field_specs(schema_name)
+        for field, field_value in value.items():
+            spec = specs.get(field)
+            if spec is None:
+                self.drift_log.record(f"{schema_name}.{field}", "undeclared field")
+            else:
+                self.check(field_value, spec, f"{schema_name}.{field}")
+
+@st.cache_resource
+def get_schema_drift_log():
+    """Process-wide log of response/schema mismatches"""
+    return SchemaDriftLog()
+
+@st.cache_resource
+def get_schema_checker():
+    """Checker built from the bundled swagger, or None if the spec can't be loaded"""
+    try:
+        with open(SWAGGER_FILE, 'rb') as f:
+            schemas = json.load(f)['components']['schemas']
+    except (OSError, ValueError, KeyError):
+        return None
+    return SchemaChecker(schemas, get_schema_drift_log(), SCHEMA_DRIFT_SAMPLE)
+
+def decode_response(schema_name, content):
+    """Parse response bytes into plain dicts, checking a sample of them for schema drift"""
+    data = parse_json(content)
+    checker = get_schema_checker()
+    if checker is not None:
+        checker.sample(schema_name, data)
+    return data
+
+# Cache of successful eligibility lookups, filled by desk searches and pre-verification
+LOOKUP_CACHE_TTL = get_setting("UHC_LOOKUP_CACHE_TTL", 12 * 3600, int)        # seconds
+LOOKUP_CACHE_MAX_ENTRIES = get_setting("UHC_LOOKUP_CACHE_MAX_ENTRIES", 5000, int)
+
+class LookupCache:
+    """TTL + LRU cache of raw eligibility response bytes, shared across sessions.
+
+    With a shared store, entries are also written there and local misses are read back from it,
+    so a lookup made on one replica is served by all of them.
+    """
+
+    def __init__(self, ttl, max_entries, shared=None, namespace='lookup'):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _local(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry['cached_at'] > self.ttl:
+            del self.entries[key]
+            entry = None
+        return entry
+
+    def _remote(self, key):
+        """Entry from the shared store, copied into the local cache"""
+        if self.shared is None:
+            return None
+        raw = self.shared.get(shared_key(self.namespace, key))
+        if raw is None:
+            return None
+        # 8-byte big-endian timestamp, then the response bytes
+        entry = {'content': raw[8:], 'cached_at': struct.unpack('>d', raw[:8])[0]}
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self._trim()
+        return entry
+
+    def _trim(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        """Cached entry {'content', 'cached_at'} or None if missing or expired"""
+        entry = self.peek(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def peek(self, key):
+        """Like get, without counting a hit or miss"""
+        with self.lock:
+            entry = self._local(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+        entry = self._remote(key)
+        if entry is not None:
+            with self.lock:
+                self.shared_hits += 1
+        return entry
+
+    def contains(self, key):
+        """Whether a fresh entry exists, without counting a hit or miss"""
+        return self.peek(key) is not None
+
+    def put(self, key, content):
+        cached_at = time.time()
+        with self.lock:
+            self.entries[key] = {'content': content, 'cached_at': cached_at}
+            self.entries.move_to_end(key)
+            self._trim()
+        if self.shared is not None:
+            self.shared.set(shared_key(self.namespace, key), struct.pack('>d', cached_at) + content, self.ttl)
+
+    def clear(self):
+        """Clear this replica's entries; the shared store expires its own"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'shared_hits': self.shared_hits, 'misses': self.misses}
+
+@st.cache_resource
+def get_lookup_cache():
+    """Process-wide eligibility lookup cache, backed by the shared store if there is one"""
+    return LookupCache(LOOKUP_CACHE_TTL, LOOKUP_CACHE_MAX_ENTRIES, shared=get_shared_state())
+
+def lookup_cache_key(member_id, date_of_birth, search_option='memberIDDateOfBirth',
+                     first_name=None, last_name=None, payer_id=None):
+    """Cache key for an eligibility lookup.
+
+    UHC matches the member on the name and payer fields as well as ID and date of birth, so a
+    search that adds or changes them is a different lookup. The provider fields identify who is
+    asking rather than the member, so they aren't part of the key.
+    """
+    fields = (member_id, date_of_birth, first_name, last_name, payer_id)
+    return '|'.join([search_option] + [(field or '').strip().upper() for field in fields])
+
+def row_lookup_cache_key(row):
+    """Lookup cache key for a roster or appointment row"""
+    return lookup_cache_key(row['member_id'], row['date_of_birth'], first_name=row.get('first_name'),
+                            last_name=row.get('last_name'), payer_id=row.get('payer_id'))
+
+# Checks made before a lookup goes upstream, and a short-lived cache of definitive failures
+MEMBER_ID_PATTERN = get_setting("UHC_MEMBER_ID_PATTERN", r"^[A-Za-z0-9-]{5,20}$")
+NEGATIVE_CACHE_TTL = get_setting("UHC_NEGATIVE_CACHE_TTL", 600, int)          # seconds
+NEGATIVE_CACHE_MAX_ENTRIES = get_setting("UHC_NEGATIVE_CACHE_MAX_ENTRIES", 2000, int)
+# 4xx responses that say something about the request itself rather than auth, throttling or timing
+NON_DEFINITIVE_STATUSES = {401, 403, 407, 408, 409, 425, 429}
+MAX_MEMBER_AGE_YEARS = 130
+
+def validate_lookup(member_id, date_of_birth):
+    """Problem with an eligibility lookup's member ID or YYYY-MM-DD date of birth, or None if it can be sent"""
+    member_id = (member_id or '').strip()
+    if not re.match(MEMBER_ID_PATTERN, member_id):
+        return f"Member ID '{member_id}' is malformed"
+    try:
+        born = datetime.strptime(date_of_birth or '', '%Y-%m-%d')
+    except ValueError:
+        return f"Date of birth '{date_of_birth}' is not a valid date"
+    today = datetime.now()
+    if born > today:
+        return f"Date of birth {date_of_birth} is in the future"
+    if born.year < today.year - MAX_MEMBER_AGE_YEARS:
+        return f"Date of birth {date_of_birth} is more than {MAX_MEMBER_AGE_YEARS} years ago"
+    return None
+
+def negative_cache_key(payload):
+    """Key for a failed lookup; unlike successes, a 4xx can depend on any field of the request"""
+    return json.dumps({**payload, 'memberId': payload['memberId'].strip().upper()}, sort_keys=True)
+
+def is_definitive_failure(status_code):
+    return 400 <= status_code < 500 and status_code not in NON_DEFINITIVE_STATUSES
+
+class PreflightStats:
+    """Counts of upstream calls avoided before sending"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'rejected': 0, 'negative_hits': 0, 'duplicates': 0}
+
+    def record(self, kind, count=1):
+        with self.lock:
+            self.counts[kind] += count
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+@st.cache_resource
+def get_preflight_stats():
+    return PreflightStats()
+
+@st.cache_resource
+def get_negative_cache():
+    """Process-wide cache of definitive 4xx lookup failures, backed by the shared store if there is one"""
+    return LookupCache(NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_ENTRIES, shared=get_shared_state(), namespace='negative')
+
+def claim_inflight_lookup(cache_key):
+    """Become the one caller fetching a lookup, or wait for the caller already fetching it.
+
+    Returns (owner, None) when this caller should fetch and then call release_inflight_lookup,
+    or (None, entry) when the other caller's result was cached meanwhile. If that caller fails,
+    its lease is released and the next waiter takes over.
+    """
+    leases = get_lease_store()
+    cache = get_lookup_cache()
+    lease = shared_key('inflight', cache_key)
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + INFLIGHT_LEASE_TTL
+    while not leases.acquire_lease(lease, owner, INFLIGHT_LEASE_TTL):
+        time.sleep(0.1)
+        entry = cache.peek(cache_key)
+        if entry is not None:
+            return None, entry
+        if time.monotonic() >= deadline:
+            return None, None
+    return owner, None
+
+def release_inflight_lookup(cache_key, owner):
+    get_lease_store().release_lease(shared_key('inflight', cache_key), owner)
+
+def cached_lookup_result(cached, show_debug):
+    """Search result for a lookup cache entry"""
+    if show_debug:
+        verified_at = datetime.fromtimestamp(cached['cached_at'])
+        st.write(f"⚡ **Served from lookup cache** (verified {verified_at.strftime('%Y-%m-%d %H:%M:%S')})")
+    return {
+        'success': True,
+        'data': decode_response('EligibilityResponse', cached['content']),
+        'status_code': 200,
+        'cached_at': cached['cached_at']
+    }
+
+@profiled
 def search_member_eligibility(member_id, date_of_birth, search_option='memberIDDateOfBirth', 
                             service_start=None, service_end=None, first_name=None, last_name=None,
-                            payer_id=None, provider_last_name=None, tax_id_number=None):
-    """Search for member eligibility information"""
+                            payer_id=None, provider_last_name=None, tax_id_number=None, show_debug=True,
+                            use_cache=True, use_negative_cache=True, token=None):
+    """Search for member eligibility information
+
+    use_cache=False skips cached successes; recently rejected requests are still answered from the
+    negative cache unless use_negative_cache=False too.
+    """
+    
+    # Malformed lookups would only come back as errors, so don't send them
+    problem = validate_lookup(member_id, date_of_birth)
+    if problem:
+        get_preflight_stats().record('rejected')
+        return {
+            'success': False,
+            'error': {'message': f"{problem}; not sent to UHC"},
+            'status_code': 400
+        }
+    
+    # Lookups for a specific service window always go upstream
+    cacheable = not service_start and not service_end
+    cache_key = lookup_cache_key(member_id, date_of_birth, search_option,
+                                 first_name=first_name, last_name=last_name, payer_id=payer_id)
+    inflight_owner = None
+    if use_cache and cacheable:
+        cached = get_lookup_cache().get(cache_key)
+        if cached is not None:
+            return cached_lookup_result(cached, show_debug)
+        
+        # Coalesce with a lookup of the same member already in flight on any replica
+        inflight_owner, cached = claim_inflight_lookup(cache_key)
+        if cached is not None:
+            return cached_lookup_result(cached, show_debug)
     
     url = f"{UHC_API_BASE_URL}/api/external/member/eligibility/v3.0"
     
@@ -188,30 +1728,57 @@ def search_member_eligibility(member_id, date_of_birth, search_option='memberIDD
     if service_end:
         payload["serviceEnd"] = service_end
     
+    # Repeats of a request UHC recently rejected get the same answer without a call
+    negative_key = negative_cache_key(payload)
+    if use_negative_cache:
+        rejected = get_negative_cache().get(negative_key)
+        if rejected is not None:
+            get_preflight_stats().record('negative_hits')
+            failure = json.loads(rejected['content'])
+            if show_debug:
+                st.write(f"⚡ **Answered from negative cache** (status {failure['status_code']}, "
+                         f"seen {datetime.fromtimestamp(rejected['cached_at']).strftime('%Y-%m-%d %H:%M:%S')})")
+            return {
+                'success': False,
+                'error': failure['error'],
+                'status_code': failure['status_code'],
+                'cached_at': rejected['cached_at']
+            }
+    
     try:
-        headers = get_api_headers()
-        
         # Debug information
-        st.write("📤 **Eligibility API Request Details:**")
-        st.write(f"URL: {url}")
-        st.write("Headers:")
-        st.json({k: v if k != 'Authorization' else f"{v[:20]}..." for k, v in headers.items()})
-        st.write("Payload:")
-        st.json(payload)
-        
-        # Add timestamp to show when request was made
-        st.write(f"🕐 **Request Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if show_debug:
+            st.write("📤 **Eligibility API Request Details:**")
+            st.write(f"URL: {url}")
+            if CASSETTE_MODE == 'replay':
+                st.write("Headers: none, the response is replayed from the cassette")
+            elif CREDENTIAL_POOL_ENABLED and not token:
+                st.write("Headers: issued per request from the credential pool")
+            else:
+                st.write("Headers:")
+                st.json({k: v if k != 'Authorization' else f"{v[:20]}..." for k, v in get_api_headers(token).items()})
+            st.write("Payload:")
+            st.json(payload)
+            
+            # Add timestamp to show when request was made
+            st.write(f"🕐 **Request Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+        request_started = time.monotonic()
+        response = send_api_request('eligibility', url, payload, token=token, timeout=30)
+        get_warmup().record_lookup(time.monotonic() - request_started)
         
-        st.write(f"📥 **Response Status:** {response.status_code}")
+        if show_debug:
+            st.write(f"📥 **Response Status:** {response.status_code}")
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = decode_response('EligibilityResponse', response.content)
             
-            # Debug: Show response hash to detect if responses are identical
-            response_hash = hash(str(response_data))
-            st.write(f"🔍 **Response Hash:** {response_hash} (use this to check if responses are identical)")
+            # Debug: Show content digest to detect if responses are materially identical
+            if show_debug:
+                st.write(f"🔍 **Response Digest:** {eligibility_digest(response_data)[:16]} (ignores volatile fields like transactionId)")
+            
+            if cacheable:
+                get_lookup_cache().put(cache_key, response.content)
             
             return {
                 'success': True,
@@ -226,10 +1793,16 @@ def search_member_eligibility(member_id, date_of_birth, search_option='memberIDD
                 error_data = {'message': response.text}
             
             # Show error response for debugging
-            st.write("📥 **Error Response:**")
-            st.json(error_data)
-            st.write("📥 **Raw Response Text:**")
-            st.code(response.text)
+            if show_debug:
+                st.write("📥 **Error Response:**")
+                st.json(error_data)
+                st.write("📥 **Raw Response Text:**")
+                st.code(response.text)
+            
+            if is_definitive_failure(response.status_code):
+                get_negative_cache().put(negative_key, json.dumps(
+                    {'status_code': response.status_code, 'error': error_data}
+                ).encode('utf-8'))
             
             return {
                 'success': False,
@@ -249,7 +1822,11 @@ def search_member_eligibility(member_id, date_of_birth, search_option='memberIDD
             'error': {'message': f'Unexpected error: {str(e)}'},
             'status_code': 500
         }
+    finally:
+        if inflight_owner is not None:
+            release_inflight_lookup(cache_key, inflight_owner)
 
+@profiled
 def check_network_status(member_id, date_of_birth, provider_last_name, 
                        first_date_of_service, last_date_of_service, 
                        transaction_id=None, provider_first_name=None, 
@@ -286,13 +1863,12 @@ def check_network_status(member_id, date_of_birth, provider_last_name,
         payload["providerMpin"] = ""
     
     try:
-        headers = get_api_headers()
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+        response = send_api_request('networkStatus', url, payload, timeout=30)
         
         if response.status_code == 200:
             return {
                 'success': True,
-                'data': response.json(),
+                'data': decode_response('NetworkStatus', response.content),
                 'status_code': response.status_code
             }
         else:
@@ -317,6 +1893,7 @@ def check_network_status(member_id, date_of_birth, provider_last_name,
             'status_code': 500
         }
 
+@profiled
 def get_copay_coinsurance_details(patient_key, transaction_id):
     """Get copay and coinsurance details"""
     
@@ -328,13 +1905,12 @@ def get_copay_coinsurance_details(patient_key, transaction_id):
     }
     
     try:
-        headers = get_api_headers()
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+        response = send_api_request('copay', url, payload, timeout=30)
         
         if response.status_code == 200:
             return {
                 'success': True,
-                'data': response.json(),
+                'data': decode_response('CopayResponseArray', response.content),
                 'status_code': response.status_code
             }
         else:
@@ -386,6 +1962,869 @@ def format_date_to_us(date_string):
     except Exception:
         return date_string
 
+# Per-member digests from the last roster re-verification
+ROSTER_DIGEST_FILE = get_setting("UHC_ROSTER_DIGEST_FILE", "uhc_roster_digests.json")
+# Key for the member HMACs in the digest file; changing it makes every member look new on the next run
+ROSTER_DIGEST_SECRET = get_setting("UHC_ROSTER_DIGEST_SECRET", UHC_CLIENT_SECRET)
+
+# Fields that count as a change in eligibility; everything else (transactionId, names, addresses...) is ignored
+TRACKED_POLICY_FIELDS = ('policyStatus', 'coverageType')
+TRACKED_POLICY_DATES = ('eligibilityDates', 'planDates')
+TRACKED_INSURANCE_FIELDS = ('payerId', 'payerName', 'groupNumber', 'planDescription', 'insuranceType',
+                            'lineOfBusiness', 'payerStatus')
+TRACKED_ACCUMULATORS = ('deductibleInfo', 'outOfPocketInfo', 'copayMaxInfo', 'outOfPocketMaxInfo')
+TRACKED_AMOUNT_FIELDS = ('planAmount', 'remainingAmount', 'metYtdAmount')
+
+def _policy_sort_key(policy):
+    policy_info = policy.get('policyInfo') or {}
+    insurance_info = policy.get('insuranceInfo') or {}
+    elig_dates = policy_info.get('eligibilityDates') or {}
+    return (str(policy_info.get('coverageType') or ''), str(elig_dates.get('startDate') or ''),
+            str(insurance_info.get('payerId') or ''), str(insurance_info.get('groupNumber') or ''))
+
+def extract_tracked_fields(data):
+    """Flatten the eligibility fields we track for changes into {'Policy 1 policyStatus': value, ...}"""
+    fields = {}
+    # Sort policies so the digest doesn't change when the API returns them in a different order
+    policies = sorted(data.get('memberPolicies') or [], key=_policy_sort_key)
+    for idx, policy in enumerate(policies):
+        prefix = f"Policy {idx + 1}"
+        policy_info = policy.get('policyInfo') or {}
+        insurance_info = policy.get('insuranceInfo') or {}
+
+        for field in TRACKED_POLICY_FIELDS:
+            fields[f"{prefix} {field}"] = policy_info.get(field)
+        for date_field in TRACKED_POLICY_DATES:
+            dates = policy_info.get(date_field) or {}
+            fields[f"{prefix} {date_field}.startDate"] = dates.get('startDate')
+            fields[f"{prefix} {date_field}.endDate"] = dates.get('endDate')
+        for field in TRACKED_INSURANCE_FIELDS:
+            fields[f"{prefix} {field}"] = insurance_info.get(field)
+
+        for accumulator in TRACKED_ACCUMULATORS:
+            accumulator_info = policy.get(accumulator) or {}
+            for level in ('individual', 'family'):
+                level_info = accumulator_info.get(level) or {}
+                for network in ('inNetwork', 'outOfNetwork'):
+                    amounts = level_info.get(network) or {}
+                    if amounts.get('found'):
+                        for field in TRACKED_AMOUNT_FIELDS:
+                            fields[f"{prefix} {accumulator}.{level}.{network}.{field}"] = amounts.get(field)
+
+    return {name: value for name, value in fields.items() if value is not None}
+
+def digest_tracked_fields(fields):
+    """Stable SHA-256 digest of tracked fields"""
+    canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def eligibility_digest(data):
+    """Content digest of an eligibility response that ignores volatile fields"""
+    return digest_tracked_fields(extract_tracked_fields(data))
+
+def diff_tracked_fields(previous, current):
+    """Field-level differences between two tracked field snapshots"""
+    changes = []
+    for field in sorted(set(previous) | set(current)):
+        old_value = previous.get(field)
+        new_value = current.get(field)
+        if old_value != new_value:
+            changes.append({'field': field, 'previous': old_value, 'current': new_value})
+    return changes
+
+def member_digest_key(member_id, date_of_birth):
+    """Key for a member in the digest file, an HMAC so member IDs can't be recovered by enumeration"""
+    message = f"{member_id.strip().upper()}|{date_of_birth}".encode('utf-8')
+    return hmac.new(str(ROSTER_DIGEST_SECRET or '').encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def load_roster_digests():
+    """Load per-member digests from the last roster run"""
+    try:
+        if os.path.exists(ROSTER_DIGEST_FILE):
+            with open(ROSTER_DIGEST_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        st.warning(f"Could not load roster digests: {str(e)}")
+    return {}
+
+def save_roster_digests(digests):
+    """Save per-member digests, replacing the file atomically"""
+    try:
+        temp_file = f"{ROSTER_DIGEST_FILE}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(digests, f)
+        os.replace(temp_file, ROSTER_DIGEST_FILE)
+    except Exception as e:
+        st.warning(f"Could not save roster digests: {str(e)}")
+
+def normalize_date_of_birth(value):
+    """Convert MM/DD/YYYY or YYYY-MM-DD to the API's YYYY-MM-DD format"""
+    value = (value or '').strip()
+    for fmt in ('%m/%d/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date of birth '{value}'")
+
+ROSTER_COLUMNS = {
+    'memberid': 'member_id',
+    'dateofbirth': 'date_of_birth',
+    'dob': 'date_of_birth',
+    'firstname': 'first_name',
+    'lastname': 'last_name',
+    'payerid': 'payer_id',
+    'appointment': 'appointment_time',
+    'appointmenttime': 'appointment_time',
+}
+
+APPOINTMENT_TIME_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+                            '%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M %p')
+
+def parse_appointment_time(value):
+    """Parse an appointment date/time from the formats schedulers commonly export"""
+    value = (value or '').strip()
+    for fmt in APPOINTMENT_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid appointment time '{value}'")
+
+def parse_roster_csv(uploaded_file):
+    """Read roster rows from a CSV upload; returns (rows, errors)"""
+    return parse_roster_text(uploaded_file.getvalue().decode('utf-8-sig'), count_rejected=True)
+
+def parse_roster_text(text, require_appointment=False, count_rejected=False):
+    """Read roster or appointment rows from CSV text; returns (rows, errors).
+
+    With `count_rejected`, malformed lookups count towards the avoided-call stats. Appointment
+    files are re-read on every scheduler pass, so they leave it off.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    rows, errors = [], []
+    for line_number, raw_row in enumerate(reader, start=2):
+        row = {}
+        for column, value in raw_row.items():
+            key = ROSTER_COLUMNS.get(''.join(ch for ch in (column or '').lower() if ch.isalnum()))
+            if key:
+                row[key] = (value or '').strip()
+        if not row.get('member_id') or not row.get('date_of_birth'):
+            errors.append(f"Line {line_number}: memberId and dateOfBirth are required")
+            continue
+        try:
+            row['date_of_birth'] = normalize_date_of_birth(row['date_of_birth'])
+            if require_appointment:
+                row['appointment_time'] = parse_appointment_time(row.get('appointment_time'))
+        except ValueError as e:
+            errors.append(f"Line {line_number}: {str(e)}")
+            continue
+        problem = validate_lookup(row['member_id'], row['date_of_birth'])
+        if problem:
+            if count_rejected:
+                get_preflight_stats().record('rejected')
+            errors.append(f"Line {line_number}: {problem}")
+            continue
+        rows.append(row)
+    return rows, errors
+
+def verify_roster(rows, progress=None):
+    """Re-verify every roster member and report only those whose tracked eligibility fields changed"""
+    digests = load_roster_digests()
+    report = {'checked': 0, 'changed': [], 'unchanged': 0, 'failed': [], 'duplicates': 0}
+
+    # Rows asking for the same lookup are sent once
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(row_lookup_cache_key(row), row)
+    report['duplicates'] = len(rows) - len(unique_rows)
+    get_preflight_stats().record('duplicates', report['duplicates'])
+    rows = list(unique_rows.values())
+    grid_rows = []
+
+    for idx, row in enumerate(rows):
+        result = search_member_eligibility(
+            member_id=row['member_id'],
+            date_of_birth=row['date_of_birth'],
+            first_name=row.get('first_name') or None,
+            last_name=row.get('last_name') or None,
+            payer_id=row.get('payer_id') or None,
+            show_debug=False,
+            use_cache=False
+        )
+        report['checked'] += 1
+
+        if not result['success']:
+            message = result['error'].get('message', 'Unknown error')
+            report['failed'].append({
+                'member_id': row['member_id'],
+                'date_of_birth': row['date_of_birth'],
+                'status_code': result['status_code'],
+                'message': message,
+            })
+            grid_rows.append(results_grid_row(row, 'failed', message=message))
+        else:
+            fields = extract_tracked_fields(result['data'])
+            digest = digest_tracked_fields(fields)
+            key = member_digest_key(row['member_id'], row['date_of_birth'])
+            previous = digests.get(key)
+
+            if previous and previous['digest'] == digest:
+                report['unchanged'] += 1
+                grid_rows.append(results_grid_row(row, 'unchanged', result['data']))
+            elif previous:
+                changes = diff_tracked_fields(previous['fields'], fields)
+                report['changed'].append({
+                    'member_id': row['member_id'],
+                    'date_of_birth': row['date_of_birth'],
+                    'status': 'changed',
+                    'changes': changes,
+                })
+                grid_rows.append(results_grid_row(row, 'changed', result['data'], len(changes)))
+            else:
+                # Every field of a new member is "new", so list the member once rather than field by field
+                report['changed'].append({
+                    'member_id': row['member_id'],
+                    'date_of_birth': row['date_of_birth'],
+                    'status': 'new',
+                    'changes': [{'field': '(new member)', 'previous': None, 'current': f"{len(fields)} tracked fields"}],
+                })
+                grid_rows.append(results_grid_row(row, 'new', result['data']))
+            digests[key] = {'digest': digest, 'fields': fields, 'verified_at': datetime.now().isoformat()}
+
+        if progress:
+            progress(idx + 1, len(rows))
+
+    save_roster_digests(digests)
+    report['grid'] = build_results_table(grid_rows)
+    return report
+
+# One row per verified member; a hidden column keeps the key of its stored response for the detail view
+RESULTS_GRID_COLUMNS = ('Member ID', 'Date of Birth', 'Result', 'Patient Name', 'Policies', 'Coverage Type',
+                        'Policy Status', 'Payer', 'Group Number', 'Plan', 'Eligibility Start', 'Eligibility End',
+                        'Changes', 'Message')
+RESULTS_GRID_TEXT_COLUMNS = ('Member ID', 'Patient Name', 'Payer', 'Group Number', 'Plan', 'Message')
+RESULTS_GRID_DATE_COLUMNS = ('Date of Birth', 'Eligibility Start', 'Eligibility End')
+RESULTS_GRID_PAGE_SIZES = (25, 50, 100, 250)
+
+def _grid_date(value):
+    """YYYY-MM-DD string as a date, so the column sorts chronologically"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def results_grid_row(row, outcome, data=None, changes=0, message=''):
+    """Grid row for one verified member, summarising the first of their sorted policies"""
+    policies = sorted(data.get('memberPolicies') or [], key=_policy_sort_key) if data is not None else []
+    summary = PolicySummary(policies[0]) if policies else None
+    return {
+        'Member ID': row['member_id'],
+        'Date of Birth': _grid_date(row['date_of_birth']),
+        'Result': outcome,
+        'Patient Name': summary.patient_name if summary else '',
+        'Policies': len(policies),
+        'Coverage Type': summary.coverage_type if summary else '',
+        'Policy Status': summary.policy_status if summary else '',
+        'Payer': summary.payer_name if summary else '',
+        'Group Number': summary.group_number if summary else '',
+        'Plan': summary.plan_description if summary else '',
+        'Eligibility Start': _grid_date(summary.eligibility_start) if summary else None,
+        'Eligibility End': _grid_date(summary.eligibility_end) if summary else None,
+        'Changes': changes,
+        'Message': message,
+        # Stored under the session's result budget like desk searches, so a large roster can't outgrow it
+        '_result_key': store_eligibility_result(row['member_id'], row['date_of_birth'], data,
+                                                key=f"roster|{row['member_id']}|{row['date_of_birth']}")
+                       if data is not None else None,
+    }
+
+def build_results_table(grid_rows):
+    """Columnar result set for the grid; string columns are dictionary-encoded since values repeat a lot"""
+    import pyarrow as pa
+
+    schema = pa.schema([
+        (column, pa.int64() if column in ('Policies', 'Changes')
+         else pa.date32() if column in RESULTS_GRID_DATE_COLUMNS else pa.string())
+        for column in RESULTS_GRID_COLUMNS
+    ] + [('_result_key', pa.string())])
+    table = pa.Table.from_pylist(grid_rows, schema=schema)
+    for column in ('Result', 'Coverage Type', 'Policy Status', 'Payer', 'Plan'):
+        index = table.schema.get_field_index(column)
+        table = table.set_column(index, column, table[column].dictionary_encode())
+    return table
+
+def query_results_table(table, search='', outcomes=(), sort_by=None, descending=False):
+    """Filter and sort the result set on the server; returns a new table"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if outcomes:
+        table = table.filter(pc.is_in(table['Result'].cast(pa.string()), value_set=pa.array(list(outcomes))))
+    if search:
+        mask = None
+        for column in RESULTS_GRID_TEXT_COLUMNS:
+            matches = pc.match_substring(table[column].cast(pa.string()), search, ignore_case=True)
+            mask = matches if mask is None else pc.or_(mask, matches)
+        table = table.filter(pc.fill_null(mask, False))
+    if sort_by:
+        # Arrow can't sort dictionary-encoded columns directly, so sort their decoded values
+        column = table[sort_by]
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        order = 'descending' if descending else 'ascending'
+        table = table.take(pc.sort_indices(pa.table({'key': column}), sort_keys=[('key', order)]))
+    return table
+
+@st.fragment
+def display_results_grid(table):
+    """Paged grid over a verification result set; only the current page is sent to the browser"""
+    st.markdown(f"#### 🗂️ All Results ({table.num_rows})")
+
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([3, 2, 2, 1])
+    with filter_col1:
+        search = st.text_input("Search", placeholder="Member ID, name, payer, group, plan...", key='results_grid_search')
+    with filter_col2:
+        outcomes = st.multiselect("Result", ['new', 'changed', 'unchanged', 'failed'], key='results_grid_outcomes')
+    with filter_col3:
+        sort_by = st.selectbox("Sort by", RESULTS_GRID_COLUMNS, key='results_grid_sort')
+    with filter_col4:
+        descending = st.toggle("Desc", key='results_grid_desc')
+
+    filtered = query_results_table(table, search.strip(), outcomes, sort_by, descending)
+
+    page_col1, page_col2, page_col3 = st.columns([1, 1, 2])
+    with page_col1:
+        page_size = st.selectbox("Rows per page", RESULTS_GRID_PAGE_SIZES, key='results_grid_page_size')
+    page_count = max(1, -(-filtered.num_rows // page_size))
+    with page_col2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key='results_grid_page')
+    with page_col3:
+        st.caption(f"{filtered.num_rows} matching members, page {page} of {page_count}")
+
+    page_table = filtered.slice((page - 1) * page_size, page_size)
+    # A new key per view resets the row selection when the page or filters change
+    view_key = hashlib.sha256(f"{search}|{outcomes}|{sort_by}|{descending}|{page_size}|{page}".encode('utf-8')).hexdigest()[:12]
+    event = st.dataframe(
+        page_table.select(list(RESULTS_GRID_COLUMNS)).to_pandas(),
+        on_select='rerun',
+        selection_mode='single-row',
+        hide_index=True,
+        use_container_width=True,
+        column_config={column: st.column_config.DateColumn(format="MM/DD/YYYY") for column in RESULTS_GRID_DATE_COLUMNS},
+        key=f"results_grid_{view_key}"
+    )
+
+    if event.selection.rows:
+        selected = page_table.slice(event.selection.rows[0], 1).to_pylist()[0]
+        display_results_grid_detail(selected)
+
+def display_results_grid_detail(row):
+    """Full policy view for the member selected in the grid"""
+    st.markdown(f"#### 👤 {row['Member ID']} ({row['Date of Birth'].strftime('%m/%d/%Y')})")
+    if row['Result'] == 'failed':
+        st.error(f"❌ Lookup failed: {row['Message']}")
+        return
+
+    record = get_stored_eligibility_result(row['_result_key'])
+    if record is None:
+        st.warning("⚠️ This result was evicted to stay within the memory budget. Search again to view it.")
+        return
+    display_formatted_eligibility_results(record.load_data())
+
+def display_roster_report(report):
+    """Show the changed members from a roster re-verification"""
+    rep_col1, rep_col2, rep_col3, rep_col4, rep_col5 = st.columns(5)
+    rep_col1.metric("Checked", report['checked'])
+    rep_col2.metric("Changed", len(report['changed']))
+    rep_col3.metric("Unchanged", report['unchanged'])
+    rep_col4.metric("Failed", len(report['failed']))
+    rep_col5.metric("Duplicates", report.get('duplicates', 0))
+
+    if report['changed']:
+        st.markdown("#### 🔀 Changed Members")
+        change_rows = [
+            {
+                'Member ID': member['member_id'],
+                'Date of Birth': format_date_to_us(member['date_of_birth']),
+                'Status': member['status'],
+                'Field': change['field'],
+                'Previous': str(change['previous']) if change['previous'] is not None else '',
+                'Current': str(change['current']) if change['current'] is not None else '',
+            }
+            for member in report['changed']
+            for change in member['changes'] or [{'field': '(no tracked fields)', 'previous': None, 'current': None}]
+        ]
+        st.dataframe(change_rows, use_container_width=True)
+    else:
+        st.info("No eligibility changes since the last run.")
+
+    if report['failed']:
+        st.markdown("#### ❌ Failed Lookups")
+        st.dataframe([
+            {
+                'Member ID': failure['member_id'],
+                'Date of Birth': format_date_to_us(failure['date_of_birth']),
+                'Status Code': failure['status_code'],
+                'Message': failure['message'],
+            }
+            for failure in report['failed']
+        ], use_container_width=True)
+
+    if report.get('grid') is not None:
+        display_results_grid(report['grid'])
+
+# Pre-verification of upcoming appointments (runs only when an appointment source is configured)
+APPOINTMENTS_FILE = get_setting("UHC_APPOINTMENTS_FILE")                        # CSV exported from the scheduler
+APPOINTMENTS_DIR = get_setting("UHC_APPOINTMENTS_DIR")                          # directory where CSV exports are dropped
+PREVERIFY_HORIZON_HOURS = get_setting("UHC_PREVERIFY_HORIZON_HOURS", 18.0, float)  # pre-verify appointments this far ahead
+PREVERIFY_OFFPEAK_HOURS = get_setting("UHC_PREVERIFY_OFFPEAK_HOURS", "")        # e.g. "19-7"; empty means any time
+PREVERIFY_RATE = get_setting("UHC_PREVERIFY_RATE", 1.0, float)                 # upstream lookups per second
+PREVERIFY_INTERVAL = get_setting("UHC_PREVERIFY_INTERVAL", 900, int)           # seconds between schedule scans
+
+def is_offpeak(now, window):
+    """Whether `now` falls in an "HH-HH" hour window, which may wrap past midnight"""
+    if not window:
+        return True
+    start, end = (int(hour) for hour in window.split('-'))
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+def load_appointments():
+    """Read appointments from the configured CSV file and drop directory; returns (appointments, errors)"""
+    paths = []
+    if APPOINTMENTS_FILE:
+        paths.append(APPOINTMENTS_FILE)
+    if APPOINTMENTS_DIR and os.path.isdir(APPOINTMENTS_DIR):
+        paths.extend(
+            os.path.join(APPOINTMENTS_DIR, name) for name in sorted(os.listdir(APPOINTMENTS_DIR))
+            if name.lower().endswith('.csv')
+        )
+
+    appointments, errors = [], []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                text = f.read()
+        except OSError as e:
+            errors.append(f"{path}: {str(e)}")
+            continue
+        rows, row_errors = parse_roster_text(text, require_appointment=True)
+        appointments.extend(rows)
+        errors.extend(f"{os.path.basename(path)} {row_error}" for row_error in row_errors)
+    return appointments, errors
+
+class PreVerificationScheduler:
+    """Background thread that pre-fetches eligibility for upcoming appointments into the lookup cache"""
+
+    def __init__(self, interval, horizon_hours, offpeak_window, rate):
+        self.interval = interval
+        self.horizon = timedelta(hours=horizon_hours)
+        self.offpeak_window = offpeak_window
+        self.min_gap = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.force_next = False
+        self.status = {
+            'state': 'starting',
+            'last_run': None,
+            'upcoming': 0,
+            'today_patients': 0,
+            'today_covered': 0,
+            'fetched': 0,
+            'already_cached': 0,
+            'failed': 0,
+            'errors': [],
+        }
+        self.thread = threading.Thread(target=self._run, name="uhc-preverify", daemon=True)
+        self.thread.start()
+
+    def trigger(self):
+        """Run a pre-verification pass now, even outside the off-peak window"""
+        self.force_next = True
+        self.wake.set()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.status, errors=list(self.status['errors']))
+
+    def _update(self, **changes):
+        with self.lock:
+            self.status.update(changes)
+
+    def _run(self):
+        while True:
+            force, self.force_next = self.force_next, False
+            try:
+                self.run_once(force=force)
+            except Exception as e:
+                self._update(state='error', errors=[f"Pre-verification failed: {str(e)}"])
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def _update_coverage(self, appointments):
+        """How many of today's patients already have a cached result, for the sidebar"""
+        today = datetime.now().date()
+        cache = get_lookup_cache()
+        todays_keys = {row_lookup_cache_key(a) for a in appointments if a['appointment_time'].date() == today}
+        covered = sum(1 for key in todays_keys if cache.contains(key))
+        self._update(today_patients=len(todays_keys), today_covered=covered)
+
+    def run_once(self, force=False):
+        now = datetime.now()
+        appointments, errors = load_appointments()
+        upcoming = [a for a in appointments if now <= a['appointment_time'] <= now + self.horizon]
+        self._update(upcoming=len(upcoming), errors=errors[:20])
+
+        if not force and not is_offpeak(now, self.offpeak_window):
+            self._update_coverage(appointments)
+            self._update(state=f"waiting for off-peak window ({self.offpeak_window})")
+            return
+
+        # One lookup per member, skipping anyone already in the cache
+        cache = get_lookup_cache()
+        pending = {}
+        for appointment in upcoming:
+            key = row_lookup_cache_key(appointment)
+            if key not in pending and not cache.contains(key):
+                pending[key] = appointment
+        self._update(state='running', already_cached=len(upcoming) - len(pending), fetched=0, failed=0)
+
+        token = get_background_token() if pending and not CREDENTIAL_POOL_ENABLED else None
+        if pending and token is None and not CREDENTIAL_POOL_ENABLED:
+            self._update(state='error', errors=errors[:19] + ["Could not obtain an OAuth token for pre-verification"])
+            return
+
+        fetched = failed = 0
+        for appointment in pending.values():
+            started = time.monotonic()
+            result = search_member_eligibility(
+                member_id=appointment['member_id'],
+                date_of_birth=appointment['date_of_birth'],
+                first_name=appointment.get('first_name') or None,
+                last_name=appointment.get('last_name') or None,
+                payer_id=appointment.get('payer_id') or None,
+                show_debug=False,
+                use_cache=False,
+                token=token
+            )
+            if result['success']:
+                fetched += 1
+            else:
+                failed += 1
+            self._update(fetched=fetched, failed=failed)
+            # Rate limit so pre-verification never competes with desk traffic for quota
+            time.sleep(max(0.0, self.min_gap - (time.monotonic() - started)))
+
+        self._update_coverage(appointments)
+        self._update(state='idle', last_run=datetime.now())
+
+@st.cache_resource
+def get_preverify_scheduler():
+    """Start the pre-verification scheduler once per process"""
+    return PreVerificationScheduler(PREVERIFY_INTERVAL, PREVERIFY_HORIZON_HOURS, PREVERIFY_OFFPEAK_HOURS, PREVERIFY_RATE)
+
+# Memory budgets for stored eligibility results
+RESULT_SESSION_BUDGET_KB = get_setting("UHC_RESULT_SESSION_BUDGET_KB", 2048, int)
+RESULT_GLOBAL_BUDGET_MB = get_setting("UHC_RESULT_GLOBAL_BUDGET_MB", 64, int)
+
+# Plan-level data, which is the same for every member of a group/plan
+PLAN_CACHE_TTL = get_setting("UHC_PLAN_CACHE_TTL", 7 * 24 * 3600, int)      # seconds
+PLAN_CACHE_MAX_ENTRIES = get_setting("UHC_PLAN_CACHE_MAX_ENTRIES", 2000, int)
+
+def plan_cache_key(insurance_info):
+    """Key for a policy's plan, or None if insuranceInfo doesn't identify one"""
+    insurance_info = insurance_info or {}
+    if not insurance_info.get('groupNumber') and not insurance_info.get('planDescription'):
+        return None
+    return '|'.join(str(insurance_info.get(field) or '') for field in
+                    ('payerId', 'groupNumber', 'planDescription', 'insuranceTypeCode'))
+
+# insuranceInfo fields that describe the plan rather than the member; the rest (member ID, address,
+# phone, HRA balance, paid-through date) stays with each member's stored response
+PLAN_FIELDS = ('payerName', 'payerId', 'payerStatus', 'groupNumber', 'insuranceType', 'insuranceTypeCode',
+               'lineOfBusiness', 'lineOfBusinessCode', 'planDescription', 'platform', 'oxfordPlatform',
+               'tieringStatus', 'administeredByUhc', 'balancedBillingProtectionActIndicator',
+               'balancedBillingProtectionActMessage')
+
+class PlanInfo:
+    """Plan-level fields of a policy, held once and referenced by every member on the plan"""
+    __slots__ = ('key', 'fields', 'created_at')
+
+    def __init__(self, key, insurance_info):
+        self.key = key
+        self.fields = {field: _intern(insurance_info[field]) for field in PLAN_FIELDS if field in insurance_info}
+        self.created_at = time.time()
+
+    @property
+    def payer_name(self):
+        return self.fields.get('payerName', 'N/A')
+
+    @property
+    def payer_id(self):
+        return self.fields.get('payerId', 'N/A')
+
+    @property
+    def group_number(self):
+        return self.fields.get('groupNumber', 'N/A')
+
+    @property
+    def insurance_type(self):
+        return self.fields.get('insuranceType', 'N/A')
+
+    @property
+    def plan_description(self):
+        return self.fields.get('planDescription', 'N/A')
+
+    @property
+    def line_of_business(self):
+        return self.fields.get('lineOfBusiness', 'N/A')
+
+class PlanCache:
+    """Plan fields keyed by payer/group/plan; stored results reference one PlanInfo per plan"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.plans = OrderedDict()
+        self.plan_hits = 0
+
+    def plan_for(self, insurance_info):
+        """Shared PlanInfo for a policy's insuranceInfo; a new one if the plan is unknown, stale or changed"""
+        insurance_info = insurance_info or {}
+        key = plan_cache_key(insurance_info)
+        plan = PlanInfo(key, insurance_info)
+        if key is None:
+            return plan
+        with self.lock:
+            existing = self.plans.get(key)
+            if existing is not None and time.time() - existing.created_at <= self.ttl and existing.fields == plan.fields:
+                self.plans.move_to_end(key)
+                self.plan_hits += 1
+                return existing
+            self.plans[key] = plan
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.max_entries:
+                self.plans.popitem(last=False)
+        return plan
+
+    def stats(self):
+        with self.lock:
+            return {'plans': len(self.plans), 'plan_hits': self.plan_hits}
+
+@st.cache_resource
+def get_plan_cache():
+    """Process-wide plan cache"""
+    return PlanCache(PLAN_CACHE_TTL, PLAN_CACHE_MAX_ENTRIES)
+
+class PolicySummary:
+    """The per-policy fields the UI renders, kept without the surrounding response dict"""
+    __slots__ = ('patient_name', 'date_of_birth', 'plan', 'policy_status',
+                 'coverage_type', 'eligibility_start', 'eligibility_end')
+
+    def __init__(self, policy):
+        patient_info = (policy.get('patientInfo') or [{}])[0]
+        policy_info = policy.get('policyInfo') or {}
+        elig_dates = policy_info.get('eligibilityDates') or {}
+
+        name_parts = (patient_info.get('firstName', ''), patient_info.get('middleName', ''), patient_info.get('lastName', ''))
+        self.patient_name = " ".join(part for part in name_parts if part) or 'N/A'
+        self.date_of_birth = patient_info.get('dateOfBirth', 'N/A')
+        # Payer and plan fields are the same for everyone on the plan, so reference the shared copy
+        self.plan = get_plan_cache().plan_for(policy.get('insuranceInfo'))
+        # Status strings repeat across members, so keep a single shared copy of each
+        self.policy_status = _intern(policy_info.get('policyStatus', 'N/A'))
+        self.coverage_type = _intern(policy_info.get('coverageType', 'N/A'))
+        self.eligibility_start = elig_dates.get('startDate', 'N/A')
+        self.eligibility_end = elig_dates.get('endDate', 'N/A')
+
+    @property
+    def payer_name(self):
+        return self.plan.payer_name
+
+    @property
+    def payer_id(self):
+        return self.plan.payer_id
+
+    @property
+    def group_number(self):
+        return self.plan.group_number
+
+    @property
+    def insurance_type(self):
+        return self.plan.insurance_type
+
+    @property
+    def plan_description(self):
+        return self.plan.plan_description
+
+    @property
+    def line_of_business(self):
+        return self.plan.line_of_business
+
+class EligibilityRecord:
+    """Compact stored form of one eligibility response"""
+    __slots__ = ('member_id', 'date_of_birth', 'search_status', 'transaction_id', 'policies',
+                 'raw_json', 'stored_at', 'size')
+
+    def __init__(self, member_id, date_of_birth, data):
+        self.member_id = member_id
+        self.date_of_birth = date_of_birth
+        self.search_status = _intern(data.get('searchStatus', 'N/A'))
+        self.transaction_id = data.get('transactionId', 'N/A')
+        policies = data.get('memberPolicies') or []
+        self.policies = tuple(PolicySummary(policy) for policy in policies)
+        # The detail view renders from the full response, so it is kept compressed, minus the plan
+        # fields each policy's shared PlanInfo already holds
+        if policies:
+            data = {**data, 'memberPolicies': [
+                {**policy, 'insuranceInfo': {field: value for field, value in policy['insuranceInfo'].items()
+                                             if field not in summary.plan.fields}}
+                if isinstance(policy.get('insuranceInfo'), dict) else policy
+                for policy, summary in zip(policies, self.policies)
+            ]}
+        self.raw_json = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        self.stored_at = time.time()
+        self.size = self._estimate_size()
+
+    def _estimate_size(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.policies)
+        size += sum(sys.getsizeof(getattr(self, field)) for field in ('member_id', 'date_of_birth', 'transaction_id'))
+        for policy in self.policies:
+            # Interned strings are shared across records, so only count what each policy owns
+            size += sys.getsizeof(policy)
+            size += sum(sys.getsizeof(getattr(policy, field)) for field in
+                        ('patient_name', 'date_of_birth', 'eligibility_start', 'eligibility_end'))
+        size += sys.getsizeof(self.raw_json)
+        return size
+
+    def load_data(self):
+        """Full response dict, with each policy's plan fields restored from its PlanInfo"""
+        data = parse_json(zlib.decompress(self.raw_json))
+        for policy, summary in zip(data.get('memberPolicies') or [], self.policies):
+            if isinstance(policy.get('insuranceInfo'), dict):
+                policy['insuranceInfo'] = {**summary.plan.fields, **policy['insuranceInfo']}
+        return data
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class ResultStore:
+    """Stored eligibility results for every session, held within per-session and global memory budgets.
+
+    When a session goes over its budget its own oldest results are evicted; when the process goes over
+    the global budget the oldest results across all sessions are evicted.
+    """
+
+    def __init__(self, session_budget, global_budget):
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.total_size = 0
+        self.evictions = 0
+
+    def put(self, session_id, key, record):
+        with self.lock:
+            results = self.sessions.setdefault(session_id, OrderedDict())
+            if key in results:
+                self.total_size -= results.pop(key).size
+            results[key] = record
+            self.total_size += record.size
+
+            while len(results) > 1 and self._session_size(results) > self.session_budget:
+                self._evict(session_id, next(iter(results)))
+            self._enforce_global_budget()
+
+    def get(self, session_id, key):
+        with self.lock:
+            results = self.sessions.get(session_id)
+            if not results or key not in results:
+                return None
+            results.move_to_end(key)
+            return results[key]
+
+    def clear_session(self, session_id):
+        with self.lock:
+            for key in list(self.sessions.get(session_id, ())):
+                self._evict(session_id, key, count=False)
+            self.sessions.pop(session_id, None)
+
+    def report(self, session_id):
+        with self.lock:
+            results = self.sessions.get(session_id, {})
+            return {
+                'session_results': len(results),
+                'session_bytes': self._session_size(results),
+                'session_budget': self.session_budget,
+                'global_results': sum(len(r) for r in self.sessions.values()),
+                'global_bytes': self.total_size,
+                'global_budget': self.global_budget,
+                'sessions': sum(1 for r in self.sessions.values() if r),
+                'evictions': self.evictions,
+            }
+
+    def _session_size(self, results):
+        return sum(record.size for record in results.values())
+
+    def _evict(self, session_id, key, count=True):
+        record = self.sessions[session_id].pop(key)
+        self.total_size -= record.size
+        if count:
+            self.evictions += 1
+
+    def _enforce_global_budget(self):
+        if self.total_size <= self.global_budget:
+            return
+        oldest = sorted(
+            ((record.stored_at, session_id, key) for session_id, results in self.sessions.items()
+             for key, record in results.items()),
+        )
+        for _, session_id, key in oldest:
+            if self.total_size <= self.global_budget:
+                return
+            self._evict(session_id, key)
+
+@st.cache_resource
+def get_result_store():
+    """Process-wide store of compact eligibility results"""
+    return ResultStore(RESULT_SESSION_BUDGET_KB * 1024, RESULT_GLOBAL_BUDGET_MB * 1024 * 1024)
+
+def get_session_id():
+    """Stable identifier for the current browser session"""
+    if 'result_session_id' not in st.session_state:
+        st.session_state.result_session_id = uuid.uuid4().hex
+    return st.session_state.result_session_id
+
+def store_eligibility_result(member_id, date_of_birth, data, key=None):
+    """Store an eligibility response in compact form and return its key"""
+    key = key or f"{member_id}|{date_of_birth}"
+    record = EligibilityRecord(member_id, date_of_birth, data)
+    get_result_store().put(get_session_id(), key, record)
+    return key
+
+def get_stored_eligibility_result(key):
+    """Look up a stored result record for the current session"""
+    return get_result_store().get(get_session_id(), key)
+
+def get_process_rss():
+    """Current resident set size in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def format_bytes(size):
+    """Human-readable byte count"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
 def display_formatted_eligibility_results(data):
     """Display eligibility results in a formatted, user-friendly way"""
     
@@ -793,6 +3232,356 @@ def display_formatted_eligibility_results(data):
     with st.expander("🔍 View Raw JSON Response", expanded=False):
         st.json(data)
 
+# Once-per-process warm-up, so the first user after a deploy doesn't pay for cold imports, token and TLS
+WARMUP_ENABLED = get_setting("UHC_WARMUP", True, bool)
+WARMUP_CONNECTIONS = get_setting("UHC_WARMUP_CONNECTIONS", 4, int)   # connections opened per UHC host
+# Modules first imported inside request or render functions; _strptime loads on the first strptime call
+WARMUP_MODULES = ('pandas', 'pyarrow', 'pyarrow.compute', '_strptime')
+WARMUP_SCHEMAS = ('EligibilityResponse', 'NetworkStatus', 'CopayResponseArray')
+
+def uhc_hosts():
+    """Root URL of each host the app talks to"""
+    roots = []
+    for url in (UHC_API_BASE_URL, UHC_OAUTH_URL):
+        scheme, _, rest = url.partition('://')
+        root = f"{scheme}://{rest.split('/')[0]}/"
+        if root not in roots:
+            roots.append(root)
+    return roots
+
+def open_connection(url, session=None):
+    """Time to first byte of a HEAD request; with the shared session, the connection stays pooled"""
+    response = (session or get_http_session()).head(url, timeout=10)
+    response.close()
+    return response.elapsed.total_seconds()
+
+def warm_imports():
+    import importlib
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+    return {'detail': ', '.join(WARMUP_MODULES)}
+
+def warm_caches():
+    checker = get_schema_checker()
+    if checker is not None:
+        for schema in WARMUP_SCHEMAS:
+            checker.field_specs(schema)
+    get_lookup_cache()
+    get_negative_cache()
+    get_plan_cache()
+    get_search_executor()
+    get_request_executor()
+    return {'detail': 'schema specs, lookup and plan caches, worker pools' if checker else 'lookup and plan caches, worker pools (no swagger)'}
+
+def warm_token():
+    if CREDENTIAL_POOL_ENABLED:
+        pool = get_credential_pool()
+        for credential in pool.credentials:
+            credential.get_token()
+        return {'detail': f"{len(pool.credentials)} pooled credentials"}
+    result = obtain_oauth_token()
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    minted = 'elapsed' in result
+    return {'detail': 'minted' if minted else 'saved token is valid', 'ttfb': result.get('elapsed')}
+
+def warm_connections():
+    executor = get_request_executor()
+    ttfbs = []
+    for root in uhc_hosts():
+        ttfbs.extend(executor.map(lambda _: open_connection(root), range(WARMUP_CONNECTIONS)))
+    return {'detail': f"{WARMUP_CONNECTIONS} per host to {', '.join(uhc_hosts())}", 'ttfb': max(ttfbs)}
+
+class Warmup:
+    """Runs the warm-up phases once in a background thread and keeps their timings.
+
+    Also records the latency of the process's first upstream lookup and whether the warm-up
+    had finished by then, so cold and warm first lookups can be compared across deploys.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = 'pending'
+        self.phases = []
+        self.started_at = None
+        self.finished_at = None
+        self.first_lookup = None
+
+    def start(self):
+        self.started_at = datetime.now()
+        self.state = 'running'
+        threading.Thread(target=self._run, name="uhc-warmup", daemon=True).start()
+
+    def _phase(self, name, func):
+        started = time.perf_counter()
+        try:
+            outcome = func()
+            error = None
+        except Exception as e:
+            outcome = {}
+            error = str(e)
+        with self.lock:
+            self.phases.append({
+                'phase': name,
+                'seconds': time.perf_counter() - started,
+                'ttfb': outcome.get('ttfb'),
+                'detail': error or outcome.get('detail', ''),
+                'ok': error is None,
+            })
+
+    def _run(self):
+        self._phase('Imports', warm_imports)
+        self._phase('Caches', warm_caches)
+        # Replayed responses never touch the network
+        if CASSETTE_MODE != 'replay':
+            self._phase('Token', warm_token)
+            self._phase('Connections', warm_connections)
+        with self.lock:
+            self.state = 'done'
+            self.finished_at = datetime.now()
+
+    def record_lookup(self, seconds):
+        with self.lock:
+            if self.first_lookup is None:
+                self.first_lookup = {'seconds': seconds, 'warm': self.state == 'done'}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'phases': list(self.phases),
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'first_lookup': self.first_lookup,
+            }
+
+@st.cache_resource
+def get_warmup():
+    """The process's warm-up; started on the first script run unless UHC_WARMUP is off"""
+    warmup = Warmup()
+    if WARMUP_ENABLED:
+        warmup.start()
+    else:
+        warmup.state = 'disabled'
+    return warmup
+
+def measure_connection_latency():
+    """TTFB on a brand-new connection versus on an open pooled one, against the eligibility host"""
+    root = uhc_hosts()[0]
+    with requests.Session() as fresh:
+        cold = open_connection(root, fresh)
+    open_connection(root)
+    warm = open_connection(root)
+    return {'cold': cold, 'warm': warm}
+
+# Background eligibility searches, polled by the page so a slow response doesn't block the session
+SEARCH_WORKERS = get_setting("UHC_SEARCH_WORKERS", 8, int)                 # shared by all sessions
+SEARCH_MAX_ACTIVE_PER_SESSION = get_setting("UHC_SEARCH_MAX_ACTIVE", 5, int)
+SEARCH_HISTORY = get_setting("UHC_SEARCH_HISTORY", 20, int)                # finished jobs kept per session
+SEARCH_POLL_INTERVAL = get_setting("UHC_SEARCH_POLL_INTERVAL", 1.0, float) # seconds
+
+SEARCH_JOB_ICONS = {'queued': '⏳', 'running': '🔄', 'done': '✅', 'failed': '❌', 'cancelled': '🚫'}
+
+class SearchJob:
+    """One eligibility search submitted from a session and run on the shared search executor.
+
+    Cancelling a queued job removes it from the queue; cancelling a running job discards its
+    response when it arrives, since the in-flight HTTP request can't be interrupted.
+    """
+
+    def __init__(self, params, token=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.params = params
+        self.token = token
+        # Worker threads can't see session state, so carry the session's profiling toggle along
+        self.profile = is_profiling_enabled()
+        self.state = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.result_key = None
+        self.future = None
+        self.lock = threading.Lock()
+
+    @property
+    def member_id(self):
+        return self.params['member_id']
+
+    @property
+    def date_of_birth(self):
+        return self.params['date_of_birth']
+
+    @property
+    def active(self):
+        return self.state in ('queued', 'running')
+
+    def run(self):
+        with self.lock:
+            if self.state != 'queued':
+                return
+            self.state = 'running'
+            self.started_at = time.time()
+
+        _profiling.requests = self.profile
+        try:
+            result = search_member_eligibility(**self.params, show_debug=False, token=self.token)
+        except Exception as e:
+            # Cache and shared-state reads can raise before the request is sent; don't leave the job running
+            result = {
+                'success': False,
+                'error': {'message': f'Unexpected error: {str(e)}'},
+                'status_code': 500
+            }
+        finally:
+            _profiling.requests = False
+
+        with self.lock:
+            if self.state == 'cancelled':
+                return
+            self.finished_at = time.time()
+            self.result = result
+            self.state = 'done' if result['success'] else 'failed'
+
+    def cancel(self):
+        with self.lock:
+            if not self.active:
+                return False
+            self.state = 'cancelled'
+            self.finished_at = time.time()
+        if self.future is not None:
+            self.future.cancel()
+        return True
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - (self.started_at or self.submitted_at)
+
+@st.cache_resource
+def get_search_executor():
+    """Worker pool for background searches, separate from the hedging pool so they can't starve it"""
+    return ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='uhc-search')
+
+def get_search_jobs():
+    """This session's search jobs, newest first"""
+    if 'search_jobs' not in st.session_state:
+        st.session_state.search_jobs = []
+    return st.session_state.search_jobs
+
+def submit_search(params):
+    """Queue an eligibility search for this session; returns the job, or None if too many are active"""
+    jobs = get_search_jobs()
+    if sum(job.active for job in jobs) >= SEARCH_MAX_ACTIVE_PER_SESSION:
+        return None
+
+    # Background threads can't read session state, so hand the session's token over explicitly
+    token = None if CREDENTIAL_POOL_ENABLED else st.session_state.oauth_token
+    job = SearchJob(params, token=token)
+    job.future = get_search_executor().submit(job.run)
+    jobs.insert(0, job)
+
+    finished = [job for job in jobs if not job.active]
+    for old_job in finished[SEARCH_HISTORY:]:
+        jobs.remove(old_job)
+    return job
+
+def cancel_search_jobs():
+    """Cancel every active search of this session"""
+    for job in get_search_jobs():
+        job.cancel()
+
+def collect_search_results(jobs):
+    """Move finished responses into the result store; runs on the script thread, which owns the session"""
+    for job in reversed(jobs):
+        if job.state != 'done' or job.result_key is not None:
+            continue
+        result = job.result
+        job.result_key = store_eligibility_result(job.member_id, job.date_of_birth, result['data'])
+        job.result = {'success': True, 'cached_at': result.get('cached_at')}
+        st.session_state.eligibility_result_key = job.result_key
+        st.session_state.member_id = job.member_id
+        st.session_state.date_of_birth = job.date_of_birth
+
+def render_search_jobs(polling):
+    """Job list with cancel buttons and the selected result; reruns on its own while jobs are active"""
+    jobs = get_search_jobs()
+    collect_search_results(jobs)
+
+    if polling and not any(job.active for job in jobs):
+        # Everything finished: rerun the whole page once so the panel stops polling
+        st.rerun()
+
+    for job in jobs:
+        job_col1, job_col2 = st.columns([5, 1])
+        with job_col1:
+            status = f"{SEARCH_JOB_ICONS[job.state]} **{job.member_id}** ({job.date_of_birth}) - {job.state}, {job.elapsed():.1f}s"
+            if job.state == 'done' and job.result.get('cached_at'):
+                status += " (from lookup cache)"
+            if job.state == 'failed':
+                status += f": {job.result['error'].get('message', 'Unknown error')}"
+                if job.result.get('cached_at'):
+                    status += " (recently rejected, not re-sent)"
+            st.markdown(status)
+        with job_col2:
+            if job.active and st.button("✖️ Cancel", key=f"cancel_search_{job.id}"):
+                job.cancel()
+                st.rerun()
+
+    completed = [job for job in jobs if job.state == 'done']
+    if not completed:
+        return
+
+    selected = completed[0]
+    if len(completed) > 1:
+        by_id = {job.id: job for job in completed}
+        selected = by_id[st.selectbox(
+            "Show results for",
+            list(by_id),
+            format_func=lambda job_id: f"{by_id[job_id].member_id} ({by_id[job_id].date_of_birth}) - "
+                                       f"{datetime.fromtimestamp(by_id[job_id].finished_at).strftime('%H:%M:%S')}",
+        )]
+
+    record = get_stored_eligibility_result(selected.result_key)
+    if record is None:
+        st.warning("⚠️ This result was evicted to stay within the memory budget. Search again to view it.")
+        return
+    display_eligibility_summary(record)
+    # The full response is only decompressed and parsed when asked for
+    if st.toggle("📄 Show full details", key=f"full_details_{selected.id}"):
+        display_formatted_eligibility_results(record.load_data())
+
+def display_eligibility_summary(record):
+    """Policy overview for a stored result, rendered from its compact records"""
+    st.subheader("📋 Eligibility Summary")
+    summary_col1, summary_col2, summary_col3 = st.columns(3)
+    summary_col1.metric("Member ID", record.member_id)
+    summary_col2.metric("Search Status", record.search_status)
+    summary_col3.metric("Policies", len(record.policies))
+    if not record.policies:
+        st.warning("⚠️ No member policies found in the response.")
+        return
+    st.dataframe([
+        {
+            'Patient Name': policy.patient_name,
+            'Date of Birth': format_date_to_us(policy.date_of_birth),
+            'Policy Status': policy.policy_status,
+            'Coverage Type': policy.coverage_type,
+            'Payer': policy.payer_name,
+            'Plan': policy.plan_description,
+            'Group Number': policy.group_number,
+            'Eligibility Start': format_date_to_us(policy.eligibility_start),
+            'Eligibility End': format_date_to_us(policy.eligibility_end),
+        }
+        for policy in record.policies
+    ], use_container_width=True, hide_index=True)
+
+def display_search_jobs():
+    """Search job panel, polling every SEARCH_POLL_INTERVAL seconds while any job is queued or running"""
+    jobs = get_search_jobs()
+    if not jobs:
+        return
+    polling = any(job.active for job in jobs)
+    st.fragment(render_search_jobs, run_every=SEARCH_POLL_INTERVAL if polling else None)(polling)
+
 def main():
     st.set_page_config(
         page_title="UHC Eligibility & Network Status Checker",
@@ -800,6 +3589,9 @@ def main():
         layout="wide"
     )
     
+    # Starts the warm-up on the process's first run; later runs just get its status
+    warmup = get_warmup()
+    
     st.title("🏥 UHC Eligibility & Network Status Checker")
     st.markdown("---")
     
@@ -812,8 +3604,12 @@ def main():
     # Show environment indicator
     st.sidebar.info("🏭 **Environment:** Production")
     
-    # Check token status
+    # Check token status; a token saved since the session started (by the warm-up, another
+    # session or another replica) is picked up on the next run
     token_valid = is_token_valid()
+    if not token_valid:
+        load_session_token()
+        token_valid = is_token_valid()
     
     if token_valid:
         st.sidebar.success("✅ Token is valid")
@@ -856,9 +3652,7 @@ def main():
             # Set expiration to 1 hour from now
             st.session_state.token_expires_at = datetime.now() + timedelta(hours=1)
             st.session_state.token_generated = True
-            
-            # Save manual token to file for persistence
-            save_token_to_file(st.session_state.oauth_token, st.session_state.token_expires_at)
+            # Not saved: the token file is read by every session on this replica, and this is one user's token
             
             st.sidebar.success("✅ Manual token set successfully!")
         else:
@@ -874,10 +3668,15 @@ def main():
         st.rerun()
     
     # Add a debug button to clear all session state
-    if st.sidebar.button("🧹 Clear All Cache", help="Clear all cached search results"):
-        # Clear eligibility results
-        if 'eligibility_result' in st.session_state:
-            del st.session_state.eligibility_result
+    if st.sidebar.button("🧹 Clear All Cache", help="Clear all cached search results, including cached UHC lookups on this server"):
+        # Cancel pending searches and clear eligibility results
+        cancel_search_jobs()
+        get_lookup_cache().clear()
+        get_negative_cache().clear()
+        st.session_state.search_jobs = []
+        get_result_store().clear_session(get_session_id())
+        if 'eligibility_result_key' in st.session_state:
+            del st.session_state.eligibility_result_key
         if 'member_id' in st.session_state:
             del st.session_state.member_id
         if 'date_of_birth' in st.session_state:
@@ -892,12 +3691,163 @@ def main():
             st.code(st.session_state.oauth_token[:50] + "...")
             if st.session_state.token_expires_at:
                 st.text(f"Expires: {st.session_state.token_expires_at.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Show request hedging metrics
+    if HEDGE_ENABLED:
+        with st.sidebar.expander("⚡ Request Hedging"):
+            hedge_stats = get_hedge_tracker().snapshot()
+            hedge_col1, hedge_col2 = st.columns(2)
+            hedge_col1.metric("Requests", hedge_stats['requests'])
+            hedge_col2.metric("Hedges Sent", hedge_stats['hedges_sent'])
+            hedge_col1.metric("Hedge Wins", hedge_stats['hedge_wins'])
+            hedge_col2.metric("Hedge Losses", hedge_stats['hedge_losses'])
+            st.text(f"Suppressed by rate cap: {hedge_stats['hedges_suppressed']}")
+            for endpoint, stats in hedge_stats['latency'].items():
+                st.text(f"{endpoint}: p50 {stats['p50']:.2f}s / p99 {stats['p99']:.2f}s ({stats['samples']} samples)")
+
+    # Show credential pool health and quota usage
+    if CREDENTIAL_POOL_ENABLED:
+        with st.sidebar.expander("🔑 Credential Pool"):
+            st.dataframe(
+                [
+                    {
+                        'Name': c['name'],
+                        'Client ID': c['client_id'],
+                        'State': c['state'],
+                        'Last Min': f"{c['last_minute']}/{c['quota']}" if c['quota'] else c['last_minute'],
+                        'In Flight': c['in_flight'],
+                        'Total': c['total'],
+                        'Throttled': c['throttled'],
+                        'Token Expires': c['token_expires'],
+                        'Last Error': c['last_error'],
+                    }
+                    for c in get_credential_pool().snapshot()
+                ],
+                use_container_width=True
+            )
+
+    # Pre-verification of upcoming appointments
+    if APPOINTMENTS_FILE or APPOINTMENTS_DIR:
+        scheduler = get_preverify_scheduler()
+        with st.sidebar.expander("🗓️ Pre-verification"):
+            # As of the scheduler's last pass, so reruns don't re-read the appointment files
+            preverify_status = scheduler.snapshot()
+            if preverify_status['today_patients']:
+                st.metric("Today's cache coverage",
+                          f"{preverify_status['today_covered']}/{preverify_status['today_patients']}",
+                          f"{preverify_status['today_covered'] / preverify_status['today_patients']:.0%}",
+                          delta_color="off")
+            else:
+                st.text("No appointments today")
+            
+            st.text(f"Status: {preverify_status['state']}")
+            if preverify_status['last_run']:
+                st.text(f"Last run: {preverify_status['last_run'].strftime('%Y-%m-%d %H:%M:%S')}")
+            st.text(f"Upcoming: {preverify_status['upcoming']}, already cached: {preverify_status['already_cached']}")
+            st.text(f"Fetched: {preverify_status['fetched']}, failed: {preverify_status['failed']}")
+            for preverify_error in preverify_status['errors']:
+                st.caption(preverify_error)
+            
+            if st.button("▶️ Pre-verify Now", help="Run pre-verification immediately, ignoring the off-peak window"):
+                scheduler.trigger()
+                st.success("✅ Pre-verification started")
+
+    # Shared state across replicas
+    shared = get_shared_state()
+    if shared is not None:
+        with st.sidebar.expander("🔗 Shared State"):
+            st.text(f"Backend: {shared.description}")
+            lookup_stats = get_lookup_cache().stats()
+            st.text(f"Lookup cache: {lookup_stats['entries']} local entries")
+            st.text(f"Hits: {lookup_stats['hits']} ({lookup_stats['shared_hits']} from other replicas), "
+                    f"misses: {lookup_stats['misses']}")
+            st.text(f"Store errors: {shared.errors}")
+            if shared.last_error:
+                st.caption(shared.last_error)
+
+    # Upstream calls avoided by pre-flight checks
+    with st.sidebar.expander("🛡️ Avoided Calls"):
+        avoided = get_preflight_stats().snapshot()
+        st.text(f"Rejected as malformed: {avoided['rejected']}")
+        st.text(f"Answered from negative cache: {avoided['negative_hits']}")
+        st.text(f"Duplicate roster rows: {avoided['duplicates']}")
+        st.text(f"Negative cache entries: {get_negative_cache().stats()['entries']}")
+
+    # Startup warm-up timings
+    with st.sidebar.expander("🔥 Warm-up"):
+        warmup_status = warmup.snapshot()
+        st.text(f"Status: {warmup_status['state']}")
+        if warmup_status['finished_at']:
+            total = (warmup_status['finished_at'] - warmup_status['started_at']).total_seconds()
+            st.text(f"Finished in {total:.2f}s at {warmup_status['finished_at'].strftime('%H:%M:%S')}")
+        if warmup_status['phases']:
+            st.dataframe([
+                {
+                    'Phase': phase['phase'],
+                    'Seconds': round(phase['seconds'], 3),
+                    'TTFB': round(phase['ttfb'], 3) if phase['ttfb'] is not None else None,
+                    'Detail': phase['detail'] if phase['ok'] else f"❌ {phase['detail']}",
+                }
+                for phase in warmup_status['phases']
+            ], use_container_width=True, hide_index=True)
+        first_lookup = warmup_status['first_lookup']
+        if first_lookup:
+            st.text(f"First lookup: {first_lookup['seconds']:.3f}s ({'warm' if first_lookup['warm'] else 'cold'})")
+        if CASSETTE_MODE != 'replay' and st.button("🧪 Measure Cold vs Warm", help="TTFB on a new connection vs a pooled one"):
+            try:
+                latency = measure_connection_latency()
+                st.text(f"New connection: {latency['cold'] * 1000:.0f} ms")
+                st.text(f"Pooled connection: {latency['warm'] * 1000:.0f} ms")
+            except requests.exceptions.RequestException as e:
+                st.error(f"❌ Could not reach UHC: {str(e)}")
+
+    # Record/replay cassette status
+    if CASSETTE_MODE in ('record', 'replay'):
+        with st.sidebar.expander(f"📼 Cassette ({CASSETTE_MODE})"):
+            cassette = get_cassette()
+            st.text(f"File: {CASSETTE_FILE}")
+            if CASSETTE_MODE == 'record':
+                st.text(f"Recorded this process: {cassette.recorded}")
+            for endpoint, count in cassette.counts().items():
+                st.text(f"{endpoint}: {count} responses")
+
+    # Profiling toggle
+    st.sidebar.toggle("🔬 Profile Reruns", key='profiling_enabled', value=PROFILING_ENABLED,
+                      disabled=PROFILING_ENABLED, help="Profile each rerun and API request; results appear at the bottom of the page")
+
+    # Show response fields that don't match the swagger schemas
+    schema_drift = get_schema_drift_log().snapshot()
+    if schema_drift:
+        with st.sidebar.expander(f"🧬 Schema Drift ({len(schema_drift)})"):
+            st.dataframe(
+                [{'Location': d['location'], 'Problem': d['problem'], 'Count': d['count']} for d in schema_drift],
+                use_container_width=True
+            )
+
+    # Show memory used by stored results
+    with st.sidebar.expander("🧠 Result Memory"):
+        memory = get_result_store().report(get_session_id())
+        st.text(f"This session: {memory['session_results']} results, "
+                f"{format_bytes(memory['session_bytes'])} / {format_bytes(memory['session_budget'])}")
+        st.text(f"All sessions: {memory['global_results']} results in {memory['sessions']} sessions, "
+                f"{format_bytes(memory['global_bytes'])} / {format_bytes(memory['global_budget'])}")
+        st.text(f"Evicted: {memory['evictions']} results")
+        plan_stats = get_plan_cache().stats()
+        st.text(f"Shared plans: {plan_stats['plans']} (reused {plan_stats['plan_hits']} times)")
+        rss = get_process_rss()
+        if rss is not None:
+            st.text(f"Server RSS: {format_bytes(rss)}")
     
     # Main content - Eligibility Search only
     st.header("🔍 Member Eligibility Search")
     
-    # Show token status
-    if not token_valid:
+    # Show token status; with a credential pool, tokens are managed per credential
+    can_search = token_valid or CREDENTIAL_POOL_ENABLED or CASSETTE_MODE == 'replay'
+    if CASSETTE_MODE == 'replay':
+        st.info(f"📼 Replaying recorded responses from {CASSETTE_FILE} - no requests are sent to UHC")
+    elif CREDENTIAL_POOL_ENABLED:
+        st.success(f"✅ Using a pool of {len(UHC_CREDENTIALS)} credentials - ready to perform searches!")
+    elif not token_valid:
         st.warning("⚠️ Please generate an OAuth token first using the sidebar to perform searches.")
     else:
         st.success("✅ OAuth token is valid - ready to perform searches!")
@@ -916,10 +3866,18 @@ def main():
         provider_last_name = st.text_input("Provider Last Name", placeholder="Optional")
         tax_id_number = st.text_input("Tax ID Number", placeholder="Optional")
         search_option = st.selectbox("Search Option", ["memberIDDateOfBirth"])
+        force_refresh = st.checkbox("🔄 Bypass cache", help="Fetch fresh eligibility from UHC instead of a cached result")
     
         # Submit button - check token validity on click
-    if st.button("🔍 Search Eligibility", type="primary", disabled=not token_valid):
-        if not token_valid:
+    search_col1, search_col2 = st.columns([3, 1])
+    with search_col1:
+        search_clicked = st.button("🔍 Search Eligibility", type="primary", disabled=not can_search)
+    with search_col2:
+        if any(job.active for job in get_search_jobs()) and st.button("✖️ Cancel All Searches"):
+            cancel_search_jobs()
+    
+    if search_clicked:
+        if not can_search:
             st.error("❌ Cannot perform search: OAuth token is required. Please generate a token first.")
         elif member_id and date_of_birth_str:
             # Validate and convert date format
@@ -927,36 +3885,28 @@ def main():
                 # Parse MM/DD/YYYY format
                 date_of_birth = datetime.strptime(date_of_birth_str, '%m/%d/%Y')
                 
-                # Show debug information
-                st.info(f"🔍 Searching for Member ID: {member_id}")
-                st.info(f"📅 Date of Birth: {date_of_birth.strftime('%m/%d/%Y')} (API format: {date_of_birth.strftime('%Y-%m-%d')})")
-                
-                with st.spinner("Searching member eligibility..."):
-                    result = search_member_eligibility(
-                        member_id=member_id,
-                        date_of_birth=date_of_birth.strftime('%Y-%m-%d'),
-                        search_option=search_option,
-                        first_name=first_name or None,
-                        last_name=last_name or None,
-                        payer_id=payer_id or None,
-                        provider_last_name=provider_last_name or None,
-                        tax_id_number=tax_id_number or None
-                    )
-                
-                if result['success']:
-                    st.success("✅ Eligibility search completed successfully!")
-                    
-                    # Store results in session state
-                    st.session_state.eligibility_result = result['data']
-                    st.session_state.member_id = member_id
-                    st.session_state.date_of_birth = date_of_birth.strftime('%Y-%m-%d')
-                    
-                    # Display formatted results
-                    display_formatted_eligibility_results(result['data'])
-                
+                problem = validate_lookup(member_id, date_of_birth.strftime('%Y-%m-%d'))
+                if problem:
+                    get_preflight_stats().record('rejected')
+                    st.error(f"❌ {problem}. Please check it and search again.")
                 else:
-                    st.error(f"❌ Search failed: {result['error'].get('message', 'Unknown error')}")
-                    st.json(result['error'])
+                    # Searches run in the background; results appear below as they complete
+                    job = submit_search({
+                        'member_id': member_id,
+                        'date_of_birth': date_of_birth.strftime('%Y-%m-%d'),
+                        'search_option': search_option,
+                        'first_name': first_name or None,
+                        'last_name': last_name or None,
+                        'payer_id': payer_id or None,
+                        'provider_last_name': provider_last_name or None,
+                        'tax_id_number': tax_id_number or None,
+                        'use_cache': not force_refresh,
+                        'use_negative_cache': not force_refresh
+                    })
+                    if job is None:
+                        st.error(f"❌ {SEARCH_MAX_ACTIVE_PER_SESSION} searches are already running. Wait for one to finish or cancel one.")
+                    else:
+                        st.info(f"🔍 Queued search for Member ID {member_id}, born {date_of_birth.strftime('%m/%d/%Y')}")
                     
             except ValueError:
                 st.error("❌ Invalid date format. Please enter date in MM/DD/YYYY format (e.g., 01/15/1990)")
@@ -965,9 +3915,42 @@ def main():
         else:
             st.error("❌ Please fill in Member ID and Date of Birth")
     
+    display_search_jobs()
+    
+    # Roster re-verification
+    st.markdown("---")
+    st.header("📋 Roster Re-verification")
+    st.markdown("*Upload a CSV with memberId and dateOfBirth columns (firstName, lastName and payerId are optional). Only members whose eligibility changed since the last run are listed.*")
+    
+    roster_file = st.file_uploader("Roster CSV", type=['csv'])
+    
+    if st.button("🔁 Re-verify Roster", disabled=not can_search or roster_file is None):
+        rows, row_errors = parse_roster_csv(roster_file)
+        for row_error in row_errors:
+            st.warning(f"⚠️ Skipped {row_error}")
+        
+        if rows:
+            progress_bar = st.progress(0.0, text="Re-verifying roster...")
+            st.session_state.roster_report = verify_roster(
+                rows,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"Verified {done} of {total} members")
+            )
+        else:
+            st.error("❌ No valid roster rows found")
+    
+    if st.session_state.get('roster_report'):
+        display_roster_report(st.session_state.roster_report)
+    
+    if is_profiling_enabled() or CASSETTE_MODE == 'replay':
+        st.markdown("---")
+    if CASSETTE_MODE == 'replay':
+        display_cassette_benchmark()
+    if is_profiling_enabled():
+        display_profiles()
+    
     # Footer
     st.markdown("---")
     st.markdown("*UHC Eligibility & Network Status Checker - Built with Streamlit*")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_profiled_rerun(main)
\ No newline at end of file
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Settings are read when streamlit_app is imported, so set them first
+os.environ.setdefault('UHC_CLIENT_ID', 'test-client')
+os.environ.setdefault('UHC_CLIENT_SECRET', 'test-secret')
+os.environ['UHC_SHARED_STATE_URL'] = 'memory://'
+os.environ['UHC_WARMUP'] = 'false'
+os.environ['UHC_HEDGE_ENABLED'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import streamlit_app as app
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'{"memberPolicies":[]}'):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode('utf-8')
+        self.headers = {}
+
+
+def run_concurrently(target, count):
+    results = [None] * count
+
+    def run(idx):
+        results[idx] = target()
+
+    threads = [threading.Thread(target=run, args=(idx,)) for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return results
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return app.MemoryStateBackend()
+    return app.SQLiteStateBackend(str(tmp_path / 'state.db'))
+
+
+def test_lease_is_exclusive_until_released(backend):
+    assert backend.acquire_lease('lease', 'a', 30)
+    assert not backend.acquire_lease('lease', 'b', 30)
+
+    # Only the holder can release it
+    backend.release_lease('lease', 'b')
+    assert not backend.acquire_lease('lease', 'b', 30)
+
+    backend.release_lease('lease', 'a')
+    assert backend.acquire_lease('lease', 'b', 30)
+
+
+def test_expired_lease_is_handed_over(backend):
+    assert backend.acquire_lease('lease', 'a', 0.2)
+    assert not backend.acquire_lease('lease', 'b', 30)
+    time.sleep(0.3)
+    assert backend.acquire_lease('lease', 'b', 30)
+
+    # The previous holder's late release doesn't free the new holder's lease
+    backend.release_lease('lease', 'a')
+    assert not backend.acquire_lease('lease', 'c', 30)
+
+
+def test_concurrent_lookups_are_coalesced(monkeypatch):
+    calls = []
+
+    def fake_send(endpoint, url, payload, token=None, timeout=30):
+        calls.append(payload['memberId'])
+        time.sleep(0.3)
+        return FakeResponse(200)
+
+    monkeypatch.setattr(app, 'send_api_request', fake_send)
+    results = run_concurrently(
+        lambda: app.search_member_eligibility('COALESCE1', '1990-01-01', show_debug=False, token='Bearer t'), 5
+    )
+
+    assert calls == ['COALESCE1']
+    assert all(result['success'] for result in results)
+
+
+def test_waiter_takes_over_when_owner_fails(monkeypatch):
+    calls = []
+
+    def fake_send(endpoint, url, payload, token=None, timeout=30):
+        calls.append(payload['memberId'])
+        time.sleep(0.3)
+        return FakeResponse(503 if len(calls) == 1 else 200)
+
+    monkeypatch.setattr(app, 'send_api_request', fake_send)
+    results = run_concurrently(
+        lambda: app.search_member_eligibility('HANDOVER1', '1990-01-01', show_debug=False, token='Bearer t'), 2
+    )
+
+    assert len(calls) == 2
+    assert sorted(result['status_code'] for result in results) == [200, 503]
+
+
+def test_concurrent_token_requests_mint_once(monkeypatch, tmp_path):
+    mints = []
+
+    def fake_fetch(client_id=None, client_secret=None):
+        mints.append(client_id)
+        time.sleep(0.3)
+        return {'success': True, 'token': 'Bearer minted', 'expires_at': datetime.now() + timedelta(hours=1),
+                'method': 'Test'}
+
+    monkeypatch.setattr(app, 'fetch_oauth_token', fake_fetch)
+    token_file = str(tmp_path / 'token.json')
+    results = run_concurrently(lambda: app.obtain_oauth_token('mint-once', 'secret', token_file), 5)
+
+    assert mints == ['mint-once']
+    assert {result['token'] for result in results} == {'Bearer minted'}
+
+
+def test_unreadable_shared_token_falls_back_to_file(tmp_path):
+    key = app.shared_key('token', 'corrupt-client')
+    app.get_shared_state().set(key, b'not json', 60)
+
+    assert app.load_token_from_file(str(tmp_path / 'missing.json'), 'corrupt-client') == (None, None)
+    assert app.get_shared_state().get(key) is None
+
+
+def test_unshared_token_stays_local(tmp_path):
+    token_file = str(tmp_path / 'token.json')
+    expires_at = datetime.now() + timedelta(hours=1)
+    app.save_token_to_file('Bearer manual', expires_at, token_file, 'manual-client', share=False)
+
+    assert app.get_shared_state().get(app.shared_key('token', 'manual-client')) is None
+    assert app.load_token_from_file(token_file, 'manual-client')[0] == 'Bearer manual'